@@ -1,6 +1,6 @@
 # coding: utf-8
 # @author octopoulo <polluxyz@gmail.com>
-# @version 2020-11-12
+# @version 2026-10-18
 
 """
 Init
@@ -9,5 +9,14 @@ Init
 __all__ = [
     '__main__',
     'antifraud',
+    'archive',
+    'ballots',
+    'bench',
+    'benford',
     'commoner',
+    'counties',
+    'fetcher',
+    'profiler',
+    'pvalue',
+    'series',
 ]
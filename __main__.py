@@ -1,26 +1,57 @@
 # coding: utf-8
 # @author octopoulo <polluxyz@gmail.com>
-# @version 2020-11-17
+# @version 2026-10-18
 
 """
 Main
 """
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
+import sys
 from time import time
 
 from antifraud import Antifraud
+from archive import parse_stamp
+
+
+def check_stamp(text: str) -> str:
+    """Check a timestamp argument, a malformed one would be 0 = the last snapshot
+    """
+    if not parse_stamp(text):
+        raise ArgumentTypeError(f'invalid timestamp: {text}, ex: 2020-11-04T12:00:00Z')
+    return text
 
 
 def main():
     parser = ArgumentParser(description='Antifraud', prog='python __main__.py')
     add = parser.add_argument
 
+    add('--archive', action='store_true', help='add each download to the history in data/archive/')
+    add('--at', nargs='?', type=check_stamp, help='analyse the archived snapshot at this time, ex: 2020-11-04T12:00:00Z')
+    add('--binary', action='store_true', help='also save the results in a columnar file: data/<year>.bin')
+    add('--cache', action='store_true', help='keep the Benford results in data/benford-cache.pkl')
+    add('--concurrency', nargs='?', default=8, type=int, help='number of simultaneous downloads')
+    add('--compress', nargs='*', choices=['br', 'gz'], help='also save compressed copies of the results')
     add('--convert', action='store_true', help='convert html to json')
     add('--covid', action='store_true', help='get covid data')
+    add('--covid-url', nargs='?', help='base url of the covid pages, ex: http://localhost:8000/coronavirus/')
     add('--download', nargs='?', default='', const='nytimes', help='download new data', choices=['nytimes'])
     add('--file', nargs='?', help='input filename, ex: 2020-president-data.json')
-    add('--pa', action='store_true', help='count data from Pennsylvania')
+    add('--format', nargs='?', default='pretty', choices=['compact', 'pretty', 'stream'], help='format of the results')
+    add('--incremental', action='store_true', help='only analyse what changed since the previous run')
+    add('--jobs', nargs='?', default=1, const=0, type=int, help='number of processes to analyse the states, 0 = all cores')
+    add('--log', nargs='?', default='', const='info', choices=['debug', 'info', 'warning'],
+        help='log the analysis in data/<year>.log, debug = + the sliding windows')
+    add('--pa', action='store_true',
+        help='count the PA mail ballots by county, party + date: data/pa-ballots.json, via the store data/pa-ballots.bin')
+    add('--pa-benford', action='store_true',
+        help='Benford tests of the PA mail ballots returned by county + day, by party: data/pa-benford.json')
+    add('--precision', nargs='?', default=-1, type=int, help='round the floats of the results, -1 = no rounding')
+    add('--profile', nargs='?', default='', const='basic', choices=['basic', 'cprofile', 'tracemalloc'],
+        help='time the stages + save data/profile.json, optionally with cProfile or tracemalloc')
+    add('--rate', nargs='?', default=0, type=float, help='max downloads per second per host, 0 = no limit')
+    add('--timeout', nargs='?', default=30, type=float, help='download timeout in seconds')
+    add('--ttl', nargs='?', default=0, type=float, help='seconds before a cached download is checked again')
     add('--year', nargs='?', default=None, type=int, help='year to analyse', choices=[2012, 2016, 2020])
 
     # configure args
@@ -32,15 +63,17 @@ def main():
     antifraud = Antifraud(**args_dict)
     antifraud.initialise()
     if args.convert:
-        antifraud.convert_folder()
+        antifraud.run(antifraud.convert_folder)
     elif args.covid:
-        antifraud.download_covid()
+        antifraud.run(antifraud.download_covid)
     elif args.download:
-        antifraud.download_president()
+        antifraud.run(antifraud.download_president)
     elif args.pa:
-        antifraud.pennsylvania()
-    else:
-        antifraud.go()
+        antifraud.run(antifraud.pennsylvania)
+    elif args.pa_benford:
+        antifraud.run(antifraud.analyse_ballots)
+    elif antifraud.run(antifraud.go) is False:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
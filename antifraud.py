@@ -1,50 +1,45 @@
 # coding: utf-8
 # @author octopoulo <polluxyz@gmail.com>
-# @version 2020-11-27
+# @version 2026-10-18
 
 """
 Antifraud
 """
 
-from collections import Counter
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 import csv
 from datetime import datetime, timezone
+from itertools import tee
 import json
-from logging import getLogger
-from math import log10
+from logging import DEBUG, INFO, WARNING, getLogger
+import mmap
 import os
+import pickle
 import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, TextIO, Tuple
 
-import requests
+import numpy as np
 
-from commoner import clamp, open_json_file, read_text_safe, save_json_file, write_text_safe
+from archive import Archive, parse_stamp
+from ballots import PARTY_GROUPS, BallotStore, ingest_ballots, is_store_fresh
+from benford import (
+    ENOUGHS, BenfordCache, PrefixCounts, calculate_benford, calculate_table, count_series, get_digit_table, score_counts)
+from commoner import (
+    get_digest, get_fingerprint, get_offsets, iter_bounded, iter_json_data, iter_json_file, makedirs_safe,
+    open_json_file, read_text_safe, save_columnar_file, save_json_file, save_json_stream, write_text_safe)
+from counties import Counties
+from fetcher import Fetcher
+from profiler import PROFILER
+from series import SERIES_FIELDS, Series, align_stamps, narrow_windows, parse_stamps
 
 
 DATA_FOLDER = 'data'
 
-# https://en.wikipedia.org/wiki/Benford%27s_law
-BENFORDS = [
-    [],
-    [log10(1 + 1 / n) if n > 0 else 0 for n in range(10)],
-    [0.12, 0.114, 0.109, 0.104, 0.10, 0.097, 0.093, 0.09, 0.088, 0.085],
-    [0.102, 0.101, 0.101, 0.101, 0.100, 0.100, 0.099, 0.099, 0.099, 0.098],
-]
-
-# first row is the P-value, other rows are chi-square
-CHI_SQUARES = [
-    [0.0000, 0.0010, 0.0020, 0.0030, 0.0040, 0.0050, 0.0060, 0.0070, 0.0080, 0.0090, 0.0100, 0.0200, 0.0300, 0.0400, 0.0500, 0.0600, 0.0700, 0.0800, 0.0900, 0.1000, 0.1100, 0.1200, 0.1300, 0.1400, 0.1500, 0.1600, 0.1700, 0.1800, 0.1900, 0.2000, 0.2100, 0.2200, 0.2300, 0.2400, 0.2500, 0.2600, 0.2700, 0.2800, 0.2900, 0.3000, 0.3100, 0.3200, 0.3300, 0.3400, 0.3500, 0.3600, 0.3700, 0.3800, 0.3900, 0.4000, 0.4100, 0.4200, 0.4300, 0.4400, 0.4500, 0.4600, 0.4700, 0.4800, 0.4900, 0.5000, 0.5100, 0.5200, 0.5300, 0.5400, 0.5500, 0.5600, 0.5700, 0.5800, 0.5900, 0.6000, 0.6100, 0.6200, 0.6300, 0.6400, 0.6500, 0.6600, 0.6700, 0.6800, 0.6900, 0.7000, 0.7100, 0.7200, 0.7300, 0.7400, 0.7500, 0.7600, 0.7700, 0.7800, 0.7900, 0.8000, 0.8100, 0.8200, 0.8300, 0.8400, 0.8500, 0.8600, 0.8700, 0.8800, 0.8900, 0.9000, 0.9100, 0.9200, 0.9300, 0.9400, 0.9500, 0.9600, 0.9700, 0.9800, 0.9900, 0.9910, 0.9920, 0.9930, 0.9940, 0.9950, 0.9960, 0.9970, 0.9980, 0.9990, 0.9991, 0.9992, 0.9993, 0.9994, 0.9995, 0.9996, 0.9997, 0.9998, 0.9999, 0.99999],
-    #
-    [ 0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.290,  0.306,  0.323,  0.340,  0.357,  0.376,  0.394,  0.414,  0.434,  0.455,  0.477,  0.499,  0.522,  0.546,  0.571,  0.596,  0.623,  0.650,  0.679,  0.708,  0.739,  0.771,  0.804,  0.838,  0.873,  0.910,  0.949,  0.989,  1.031,  1.074,  1.120,  1.167,  1.217,  1.269,  1.323,  1.381,  1.441,  1.504,  1.571,  1.642,  1.718,  1.798,  1.883,  1.974,  2.072,  2.178,  2.293,  2.417,  2.554,  2.706,  2.874,  3.065,  3.283,  3.537,  3.841,  4.218,  4.709,  5.412,  6.635,  6.823,  7.033,  7.273,  7.550,  7.879,  8.284,  8.807,  9.550, 10.828, 11.023, 11.241, 11.489, 11.776, 12.116, 12.532, 13.070, 13.831, 15.137, 19.511],
-    [ 0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.000,  0.302,  0.325,  0.349,  0.373,  0.397,  0.421,  0.446,  0.471,  0.497,  0.523,  0.549,  0.575,  0.602,  0.629,  0.657,  0.685,  0.713,  0.742,  0.771,  0.801,  0.831,  0.862,  0.893,  0.924,  0.956,  0.989,  1.022,  1.055,  1.089,  1.124,  1.160,  1.196,  1.232,  1.270,  1.308,  1.347,  1.386,  1.427,  1.468,  1.510,  1.553,  1.597,  1.642,  1.688,  1.735,  1.783,  1.833,  1.883,  1.935,  1.989,  2.043,  2.100,  2.158,  2.217,  2.279,  2.342,  2.408,  2.476,  2.546,  2.619,  2.694,  2.773,  2.854,  2.939,  3.028,  3.121,  3.219,  3.321,  3.430,  3.544,  3.665,  3.794,  3.932,  4.080,  4.241,  4.415,  4.605,  4.816,  5.051,  5.319,  5.627,  5.991,  6.438,  7.013,  7.824,  9.210,  9.421,  9.657,  9.924, 10.232, 10.597, 11.043, 11.618, 12.429, 13.816, 14.026, 14.262, 14.529, 14.837, 15.202, 15.648, 16.223, 17.034, 18.421, 23.026],
-    [ 0.000,  0.024,  0.039,  0.051,  0.062,  0.072,  0.081,  0.090,  0.099,  0.107,  0.115,  0.185,  0.245,  0.300,  0.352,  0.401,  0.449,  0.495,  0.540,  0.584,  0.628,  0.671,  0.714,  0.756,  0.798,  0.839,  0.881,  0.922,  0.964,  1.005,  1.047,  1.088,  1.129,  1.171,  1.213,  1.254,  1.296,  1.339,  1.381,  1.424,  1.467,  1.510,  1.553,  1.597,  1.642,  1.686,  1.731,  1.777,  1.823,  1.869,  1.916,  1.964,  2.012,  2.060,  2.109,  2.159,  2.210,  2.261,  2.313,  2.366,  2.420,  2.474,  2.529,  2.586,  2.643,  2.701,  2.761,  2.821,  2.883,  2.946,  3.011,  3.076,  3.144,  3.213,  3.283,  3.355,  3.430,  3.506,  3.584,  3.665,  3.748,  3.834,  3.922,  4.014,  4.108,  4.207,  4.309,  4.415,  4.526,  4.642,  4.763,  4.890,  5.025,  5.167,  5.317,  5.477,  5.649,  5.833,  6.033,  6.251,  6.491,  6.759,  7.060,  7.407,  7.815,  8.311,  8.947,  9.837, 11.345, 11.573, 11.827, 12.115, 12.447, 12.838, 13.316, 13.931, 14.796, 16.266, 16.489, 16.738, 17.020, 17.346, 17.730, 18.200, 18.805, 19.656, 21.108, 25.902],
-    [ 0.000,  0.091,  0.129,  0.159,  0.184,  0.207,  0.228,  0.247,  0.264,  0.281,  0.297,  0.429,  0.535,  0.627,  0.711,  0.788,  0.862,  0.931,  0.999,  1.064,  1.127,  1.188,  1.249,  1.308,  1.366,  1.424,  1.481,  1.537,  1.593,  1.649,  1.704,  1.759,  1.814,  1.868,  1.923,  1.977,  2.031,  2.086,  2.140,  2.195,  2.249,  2.304,  2.359,  2.415,  2.470,  2.526,  2.582,  2.639,  2.696,  2.753,  2.811,  2.869,  2.928,  2.987,  3.047,  3.107,  3.169,  3.231,  3.293,  3.357,  3.421,  3.486,  3.552,  3.619,  3.687,  3.756,  3.826,  3.898,  3.971,  4.045,  4.120,  4.197,  4.276,  4.356,  4.438,  4.522,  4.607,  4.695,  4.786,  4.878,  4.974,  5.072,  5.173,  5.277,  5.385,  5.497,  5.613,  5.733,  5.858,  5.989,  6.125,  6.268,  6.418,  6.577,  6.745,  6.923,  7.114,  7.318,  7.539,  7.779,  8.043,  8.337,  8.666,  9.044,  9.488, 10.026, 10.712, 11.668, 13.277, 13.519, 13.789, 14.094, 14.446, 14.860, 15.366, 16.014, 16.924, 18.467, 18.700, 18.961, 19.256, 19.596, 19.997, 20.488, 21.118, 22.005, 23.513, 28.473],
-    [ 0.000,  0.210,  0.280,  0.332,  0.375,  0.412,  0.445,  0.475,  0.503,  0.530,  0.554,  0.752,  0.903,  1.031,  1.145,  1.250,  1.347,  1.439,  1.526,  1.610,  1.691,  1.770,  1.846,  1.921,  1.994,  2.066,  2.136,  2.206,  2.275,  2.343,  2.410,  2.477,  2.543,  2.609,  2.675,  2.740,  2.805,  2.870,  2.935,  3.000,  3.065,  3.130,  3.195,  3.260,  3.325,  3.391,  3.456,  3.522,  3.589,  3.655,  3.723,  3.790,  3.858,  3.927,  3.996,  4.066,  4.136,  4.207,  4.279,  4.351,  4.425,  4.499,  4.574,  4.651,  4.728,  4.806,  4.886,  4.966,  5.048,  5.132,  5.217,  5.303,  5.391,  5.481,  5.573,  5.667,  5.763,  5.861,  5.961,  6.064,  6.170,  6.279,  6.391,  6.507,  6.626,  6.749,  6.876,  7.009,  7.146,  7.289,  7.439,  7.595,  7.759,  7.932,  8.115,  8.309,  8.516,  8.738,  8.977,  9.236,  9.521,  9.837, 10.191, 10.596, 11.070, 11.644, 12.375, 13.388, 15.086, 15.341, 15.625, 15.946, 16.315, 16.750, 17.279, 17.958, 18.907, 20.515, 20.758, 21.029, 21.335, 21.689, 22.105, 22.614, 23.268, 24.185, 25.745, 30.856],
-    [ 0.000,  0.381,  0.486,  0.562,  0.623,  0.676,  0.722,  0.764,  0.803,  0.839,  0.872,  1.134,  1.330,  1.492,  1.635,  1.765,  1.885,  1.997,  2.103,  2.204,  2.301,  2.395,  2.486,  2.575,  2.661,  2.746,  2.829,  2.910,  2.991,  3.070,  3.148,  3.226,  3.303,  3.379,  3.455,  3.530,  3.605,  3.679,  3.753,  3.828,  3.902,  3.975,  4.049,  4.123,  4.197,  4.271,  4.346,  4.420,  4.495,  4.570,  4.646,  4.721,  4.798,  4.875,  4.952,  5.030,  5.108,  5.187,  5.267,  5.348,  5.430,  5.512,  5.595,  5.680,  5.765,  5.852,  5.940,  6.029,  6.119,  6.211,  6.304,  6.399,  6.496,  6.594,  6.695,  6.797,  6.902,  7.009,  7.119,  7.231,  7.346,  7.465,  7.586,  7.712,  7.841,  7.974,  8.112,  8.255,  8.404,  8.558,  8.719,  8.888,  9.064,  9.250,  9.446,  9.654,  9.875, 10.112, 10.368, 10.645, 10.948, 11.283, 11.660, 12.090, 12.592, 13.198, 13.968, 15.033, 16.812, 17.078, 17.375, 17.710, 18.095, 18.548, 19.099, 19.805, 20.791, 22.458, 22.709, 22.990, 23.307, 23.672, 24.103, 24.628, 25.303, 26.250, 27.856, 33.107],
-    [ 0.000,  0.598,  0.741,  0.841,  0.921,  0.989,  1.049,  1.103,  1.152,  1.197,  1.239,  1.564,  1.802,  1.997,  2.167,  2.320,  2.461,  2.592,  2.716,  2.833,  2.945,  3.054,  3.158,  3.260,  3.358,  3.455,  3.549,  3.642,  3.733,  3.822,  3.911,  3.998,  4.084,  4.170,  4.255,  4.339,  4.423,  4.506,  4.589,  4.671,  4.754,  4.836,  4.918,  5.000,  5.082,  5.164,  5.246,  5.328,  5.411,  5.493,  5.576,  5.660,  5.743,  5.828,  5.913,  5.998,  6.084,  6.170,  6.258,  6.346,  6.435,  6.525,  6.615,  6.707,  6.800,  6.894,  6.989,  7.086,  7.184,  7.283,  7.384,  7.487,  7.591,  7.698,  7.806,  7.917,  8.029,  8.145,  8.263,  8.383,  8.507,  8.634,  8.765,  8.899,  9.037,  9.180,  9.327,  9.480,  9.639,  9.803,  9.975, 10.154, 10.342, 10.540, 10.748, 10.968, 11.203, 11.454, 11.724, 12.017, 12.337, 12.691, 13.088, 13.540, 14.067, 14.703, 15.509, 16.622, 18.475, 18.752, 19.060, 19.408, 19.808, 20.278, 20.849, 21.580, 22.601, 24.322, 24.581, 24.870, 25.197, 25.574, 26.018, 26.559, 27.254, 28.227, 29.878, 35.259],
-    [ 0.000,  0.857,  1.038,  1.162,  1.261,  1.344,  1.417,  1.482,  1.541,  1.596,  1.646,  2.032,  2.310,  2.537,  2.733,  2.908,  3.068,  3.217,  3.357,  3.490,  3.616,  3.737,  3.855,  3.968,  4.078,  4.186,  4.291,  4.393,  4.494,  4.594,  4.691,  4.788,  4.883,  4.977,  5.071,  5.163,  5.255,  5.346,  5.437,  5.527,  5.617,  5.707,  5.797,  5.886,  5.975,  6.065,  6.154,  6.243,  6.333,  6.423,  6.513,  6.603,  6.694,  6.785,  6.877,  6.969,  7.062,  7.155,  7.249,  7.344,  7.440,  7.537,  7.634,  7.733,  7.833,  7.933,  8.036,  8.139,  8.244,  8.351,  8.459,  8.568,  8.680,  8.794,  8.909,  9.027,  9.148,  9.270,  9.396,  9.524,  9.656,  9.791,  9.930, 10.072, 10.219, 10.370, 10.526, 10.688, 10.856, 11.030, 11.212, 11.401, 11.599, 11.808, 12.027, 12.259, 12.506, 12.770, 13.054, 13.362, 13.697, 14.068, 14.484, 14.956, 15.507, 16.171, 17.010, 18.168, 20.090, 20.377, 20.696, 21.056, 21.469, 21.955, 22.545, 23.300, 24.352, 26.124, 26.391, 26.689, 27.025, 27.412, 27.868, 28.424, 29.137, 30.136, 31.828, 37.332],
-    [ 0.000,  1.152,  1.370,  1.519,  1.637,  1.735,  1.820,  1.897,  1.966,  2.029,  2.088,  2.532,  2.848,  3.105,  3.325,  3.521,  3.700,  3.866,  4.021,  4.168,  4.308,  4.442,  4.571,  4.696,  4.817,  4.934,  5.049,  5.162,  5.272,  5.380,  5.487,  5.592,  5.695,  5.798,  5.899,  5.999,  6.099,  6.198,  6.296,  6.393,  6.490,  6.587,  6.684,  6.780,  6.876,  6.972,  7.068,  7.164,  7.261,  7.357,  7.454,  7.550,  7.648,  7.745,  7.843,  7.942,  8.041,  8.141,  8.242,  8.343,  8.445,  8.548,  8.652,  8.757,  8.863,  8.971,  9.079,  9.189,  9.301,  9.414,  9.528,  9.645,  9.763,  9.883, 10.006, 10.131, 10.258, 10.388, 10.521, 10.656, 10.795, 10.938, 11.084, 11.234, 11.389, 11.548, 11.713, 11.883, 12.059, 12.242, 12.433, 12.632, 12.840, 13.058, 13.288, 13.531, 13.790, 14.066, 14.363, 14.684, 15.034, 15.421, 15.854, 16.346, 16.919, 17.608, 18.480, 19.679, 21.666, 21.962, 22.291, 22.663, 23.089, 23.589, 24.197, 24.974, 26.056, 27.877, 28.151, 28.456, 28.801, 29.198, 29.666, 30.236, 30.966, 31.989, 33.720, 39.341],
-    [ 0.000,  1.479,  1.734,  1.908,  2.043,  2.156,  2.254,  2.341,  2.419,  2.491,  2.558,  3.059,  3.412,  3.697,  3.940,  4.157,  4.353,  4.535,  4.705,  4.865,  5.018,  5.163,  5.304,  5.439,  5.570,  5.698,  5.822,  5.943,  6.062,  6.179,  6.294,  6.407,  6.518,  6.628,  6.737,  6.845,  6.952,  7.058,  7.163,  7.267,  7.371,  7.475,  7.578,  7.681,  7.783,  7.886,  7.988,  8.090,  8.193,  8.295,  8.398,  8.501,  8.605,  8.708,  8.812,  8.917,  9.022,  9.128,  9.235,  9.342,  9.450,  9.559,  9.669,  9.780,  9.892, 10.006, 10.120, 10.236, 10.354, 10.473, 10.594, 10.717, 10.841, 10.968, 11.097, 11.228, 11.362, 11.499, 11.638, 11.781, 11.927, 12.076, 12.229, 12.387, 12.549, 12.716, 12.888, 13.066, 13.251, 13.442, 13.641, 13.849, 14.066, 14.294, 14.534, 14.788, 15.057, 15.344, 15.653, 15.987, 16.352, 16.753, 17.203, 17.713, 18.307, 19.021, 19.922, 21.161, 23.209, 23.514, 23.853, 24.235, 24.673, 25.188, 25.813, 26.611, 27.722, 29.588, 29.869, 30.181, 30.535, 30.941, 31.420, 32.003, 32.750, 33.796, 35.564, 41.296],
+# data of a saved page: 2012, 2016, 2020, by priority => anchor, offset of the JSON, end of the JSON
+SCRIPT_ANCHORS = [
+    (b'data: {', -1, b'\n'),
+    (b'eln_races = ', 0, b'\n'),
+    (b'<script class="e-map-data"', None, b'</script>'),
 ]
 
 COUNTRY_SYNONYMS = {
@@ -77,6 +72,18 @@ DOWNLOADS = {
 }
 
 CANDIDATES = {}
+COUNTY_INDICES = ([0], [1], [2], [0, 1, 2])
+COUNTY_LABELS = ('[0]', '[1]', '[2]', '[012]')
+FRAUD_CACHE = BenfordCache()
+# columns of fraud_data in the --binary file, the window fields are NaN for the other types
+FRAUD_FIELDS = [
+    'type', 'digit', 'indices', 'total', 'chi', 'score', *(f'first{i}' for i in range(10)),
+    'start', 'end', 'time_start', 'time_end', 'first_d', 'first_r', 'last_d', 'last_r']
+LOG_LEVELS = {
+    'debug': DEBUG,
+    'info': INFO,
+    'warning': WARNING,
+}
 PARTIES = {
     'DEM': 0,
     'democrat': 0,
@@ -85,13 +92,17 @@ PARTIES = {
     'republican': 1,
 }
 
-ENOUGHS = [0, 17, 27]
 MIN_COUNTS = [136, 270, 300]
 PRINT_LOG = False
 SCORE_DOUBT = 0.5
+# log label of a Benford table, by kind: 1 row per county, 1 row per day
+TABLE_LABELS = ('CN', 'DY')
 TIMESTEP = 300
 WHICH_NAMES = ['president', 'senate']
 
+# where to find the races in a file
+JSON_PATHS = [('meta', ), ('timestamp', ), (), ('data', ), ('data', 'races'), ('races', )]
+
 RE_COUNTRIES = re.compile(r'href="country/([\w-]+)/"')
 RE_SCRIPT_2012 = re.compile(r'data: (\{.+\})')
 RE_SCRIPT_2016 = re.compile(r'eln_races = (.+),')
@@ -100,211 +111,332 @@ RE_SERIE = re.compile(r"name: '(.*?)',.*?data: \[(.*?)\]", re.S)
 RE_SERIES = re.compile(r'series: (\[\{.*?\}\])', re.S)
 
 
+def analyse_state_job(task: Tuple[int, Dict[str, Any], Dict[str, int], Dict[str, Any], str]) -> Tuple[Any, ...]:
+    """Analyse a state in a worker process
+    - the log records are buffered, then logged in order by the main process
+    - fraud_cache: filename of FRAUD_CACHE with --cache, the new entries are sent back to the main process
+    :return: state_id, cands, records, cache, extras = new entries of FRAUD_CACHE + measures of PROFILER
+    """
+    i, state, candidates, previous, fraud_cache = task
+    CANDIDATES.clear()
+    CANDIDATES.update(candidates)
+    FRAUD_CACHE.filename = fraud_cache
+
+    antifraud = Antifraud(buffered=True, cache=bool(fraud_cache))
+    state_id, cands, cache = antifraud.analyse_state(i, state, previous=previous)
+    return state_id, cands, antifraud.records, cache, {'fraud': FRAUD_CACHE.pop_news(), 'profile': PROFILER.pop()}
+
+
+def convert_file_job(filename: str):
+    """Convert an HTML to JSON in a worker process
+    """
+    Antifraud().convert_file(filename)
+
+
+def extract_script(filename: str) -> Any:
+    """Extract the data of a saved page, without running RE_SCRIPT_2012/2016/2020 one after another
+    - the file is memory-mapped, each anchor of SCRIPT_ANCHORS is a plain find, no regex backtracking
+    - the JSON is bounded by the decoder (raw_decode), inside the line (2012, 2016) or the <script> (2020)
+    - an anchor not followed by valid JSON => the next one
+    :return: data, None if not found
+    """
+    if not os.path.isfile(filename) or not os.path.getsize(filename):
+        return None
+    try:
+        with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            decoder = json.JSONDecoder()
+            for anchor, offset, stop in SCRIPT_ANCHORS:
+                if (start := buffer.find(anchor)) < 0:
+                    continue
+                # 2020: the JSON starts after the end of the tag
+                start = buffer.find(b'>', start) + 1 if offset is None else start + len(anchor) + offset
+                end = buffer.find(stop, start)
+                try:
+                    text = buffer[start: end if end >= 0 else len(buffer)].decode('utf-8')
+                    return decoder.raw_decode(text, len(text) - len(text.lstrip()))[0]
+                except ValueError:
+                    continue
+    except OSError as e:
+        getLogger().warning({'status': 'extract_script__error', 'error': e, 'filename': filename})
+    return None
+
+
 class Antifraud:
     def __init__(self, **kwargs):
+        self.archive = kwargs.get('archive')            # type: bool
+        self.at = kwargs.get('at')                      # type: str
+        self.binary = kwargs.get('binary')              # type: bool
+        self.buffered = kwargs.get('buffered')          # type: bool
+        self.cache = kwargs.get('cache')                # type: bool
+        self.compress = kwargs.get('compress')          # type: List[str]
+        self.concurrency = kwargs.get('concurrency') or 8  # type: int
+        self.covid_url = kwargs.get('covid_url')        # type: str
         self.download = kwargs.get('download')          # type: str
         self.file = kwargs.get('file')                  # type: str
+        self.format = kwargs.get('format') or 'pretty'  # type: str
+        self.incremental = kwargs.get('incremental')    # type: bool
+        self.jobs = kwargs.get('jobs')                  # type: int
+        self.log_name = kwargs.get('log')               # type: str
+        self.precision = kwargs.get('precision', -1)    # type: int
+        self.profile = kwargs.get('profile')            # type: str
+        self.rate = kwargs.get('rate') or 0             # type: float
+        self.timeout = kwargs.get('timeout') or 30      # type: float
+        self.ttl = kwargs.get('ttl') or 0               # type: float
         self.year = kwargs.get('year')                  # type: int
 
-        self.county_states = {}                         # type: Dict[str, List[str]]
+        self.ballot_store = None                        # type: BallotStore
         self.countries = {}                             # type: Dict[str, List[str]]
-        self.lines = []                                 # type: List[str]
+        self.country_aliases = {}                       # type: Dict[str, List[str]]
+        self.fetcher = None                             # type: Fetcher
+        self.log_file = None                            # type: TextIO
+        self.log_level = LOG_LEVELS.get(self.log_name, DEBUG)  # type: int
         self.logger = getLogger()
+        self.recording = False                          # type: bool
+        self.records = []                               # type: List[Tuple[int, str, tuple]]
         self.states = [{}, {}]                          # type: Dict[str, Any]
 
-    def analyse_year(self, year: int, which: int):
-        """Analyse a year
+    def analyse_ballots(self):
+        """Benford tests of the PA mail ballots returned, by party: D, R, others = the d, r, l of a race
+        - 42 (PA): 1 row per county (CN) + 1 row per day (DY), then each county: 1 row per day (DY)
+        - all the counts come from 2 histograms of the store, then 1 calculate_table per test
+        => data/pa-benford.json, same state vectors as data/<year>.json: 0-3 = requests, 4-7 = returned
         """
-        print(f'analyse_year: {year} {which}')
-
-        # 0) open files
-        which_name = WHICH_NAMES[which]
-        filename = self.file
-        if not filename:
-            if year == 2020:
-                for suffix in ('-1923', '-1921', ''):
-                    filename = os.path.join(DATA_FOLDER, f'{year}-{which_name}-data{suffix}.json')
-                    if os.path.isfile(filename):
-                        break
-                    else:
-                        filename = None
-        if not filename:
-            filename = os.path.join(DATA_FOLDER, f'{year}-{which_name}-html.json')
-        data = open_json_file(filename)
-        if not data:
-            self.logger.error({'status': 'analyse_year__error', 'filename': filename})
+        store = self.get_ballot_store()
+        if not store:
             return
 
-        # 1) get data
-        meta = {}
-        states = self.states[which]
-        if isinstance(data, dict):
-            meta = data.get('meta') or data
-            data = data.get('data') or data
-        if isinstance(data, dict):
-            data = data.get('races') or data
+        # [county, party group] + [county, party group, day]
+        requests = store.group_parties(store.histogram(['county', 'party'])[0])
+        returns = store.group_parties(store.histogram(['county', 'party', 'returned'], returned=True)[0])[..., 1:]
 
-        # 2) parse all states
-        for i, state in enumerate(data):
-            # a) counties
+        states = {}
+        self.open_log(os.path.join(DATA_FOLDER, 'pa-benford.log'))
+        try:
+            items = [('42', requests.sum(axis=0), returns.sum(axis=0))]
+            items.extend(zip(store.counties, requests, returns))
+            for i, (state_id, request, days) in enumerate(items):
+                cands = self.create_empty()
+                cands[0:4] = [*request.tolist(), int(request.sum())]
+                cands[4:8] = [*days.sum(axis=1).tolist(), int(days.sum())]
+                cands[16] = PARTY_GROUPS[:]
+                if not i:
+                    self.analyse_table(i, state_id, cands, get_digit_table(returns.sum(axis=2).T))
+                self.analyse_table(i, state_id, cands, get_digit_table(days), kind=1)
+                self.calculate_score(state_id, cands, cands[13])
+                states[state_id] = cands
+
+            states['00'] = [*states['42'][:8], store.meta.get('mtime', 0) // 1000000000]
+            self.log(states['00'])
+        finally:
+            self.close_log()
+
+        output = os.path.join(DATA_FOLDER, 'pa-benford.json')
+        self.save_output(output, states)
+        print(f'{len(store.counties)} counties, {returns.shape[2]} days, fraud {states["42"][11]} => {output}')
+
+    def analyse_state(
+            self,
+            i: int,
+            state: Dict[str, Any],
+            previous: Dict[str, Any]=None,          # cache of the previous run, None = not incremental
+            ) -> Tuple[str, List[Any], Dict[str, Any] or None]:
+        """Analyse one state: counties + timeseries
+        - independent of the other states, except for CANDIDATES
+        - incremental: unchanged state => replay the previous run,
+            new timeseries points => the backtracking stops at the rows that didn't change,
+            and the Benford tests of the timeseries only count the rows after the last checkpoint that didn't change
+        :return: state_id, cands, cache for the next run (None = unchanged or not incremental)
+        """
+        state_id = state.get('state_id')
+        cache = None
+        if previous is not None:
+            self.register_candidates(state)
+            fingerprint = self.get_state_fingerprint(state)
+            if previous.get('fingerprint') == fingerprint:
+                for level, text, args in previous['lines']:
+                    self.log(text, *args, level=level)
+                return state_id, previous['cands'], None
+            cache = {'fingerprint': fingerprint}
+            num_line = len(self.records)
+            self.recording = True
+
+        # a) counties
+        with PROFILER.stage('collect_candidates', state_id):
             cands, counties = self.collect_candidates(state)
-            state_id = state.get('state_id')
-            states[state_id] = cands
-
-            fraud_chis = cands[9]
-            fraud_scores = cands[10]
-            frauds = cands[12]
-            fraud_data = cands[13]
-
-            for digit in (1, 2):
-                for j, indices in enumerate(([0], [1], [2], [0, 1, 2])):
-                    total, chi, score, firsts, enough, enough2 = self.calculate_fraud(digit, counties, indices)
-                    self.log(
-                        f"CN {i:2} {digit} {str(indices).replace(', ', ''):5} {state_id} {total:3} {chi:6.2f}"
-                        f" {str(score):5} {self.get_fraud(score, enough, enough2, 'X')} {firsts}")
-                    if not enough:
-                        continue
-                    ichi = int(chi * 100) / 100
-                    if score:
-                        frauds[j] |= 1
-                        if score > fraud_scores[0]:
-                            fraud_chis[digit - 1] = ichi
-                            fraud_scores[digit - 1] = int(score * 100) / 100
-                    fraud_data.append([0, digit, indices, total, ichi, score, firsts])
-
-            self.calculate_score(state_id, cands, fraud_data)
-
-            # b) timeseries
-            timeseries = state.get('timeseries')
-            if not timeseries:
-                continue
-            series = self.collect_timeseries(state_id, timeseries, cands[:4])
-            cands[17] = series
-
-            for digit in (1, 2):
-                for indices in ([0], [1], [3]):
-                    minmax = indices[0] != 3
-                    indices2 = indices if minmax else [2]
 
+        mark = PROFILER.start()
+        fraud_chis = cands[9]
+        fraud_scores = cands[10]
+        frauds = cands[12]
+        fraud_data = cands[13]
+
+        self.analyse_table(i, state_id, cands, counties.digits)
+        self.calculate_score(state_id, cands, fraud_data)
+        PROFILER.stop('county_benford', mark, state_id)
+
+        # b) timeseries
+        timeseries = state.get('timeseries')
+        if not timeseries:
+            return state_id, cands, self.finish_cache(cache, cands, num_line) if cache else None
+        with PROFILER.stage('collect_timeseries', state_id):
+            series = self.collect_timeseries(state_id, timeseries, cands[:4], cache=cache, previous=previous)
+        cands[17] = series
+
+        mark = PROFILER.start()
+
+        # incremental: the counts of the num_same rows that didn't change come from the previous run
+        checkpoints = {}
+        num_same = 0
+        if cache is not None:
+            cache['counts'] = {}
+            olds = previous['cands'][17] if previous.get('cands') else None
+            if previous.get('counts') and isinstance(olds, Series):
+                checkpoints = previous['counts']
+                num_old = min(len(series), len(olds))
+                changes = np.flatnonzero((series.columns[:, :num_old] != olds.columns[:, :num_old]).any(axis=0))
+                num_same = int(changes[0]) if changes.size else num_old
+
+        for digit in (1, 2):
+            for indices in ([0], [1], [3]):
+                minmax = indices[0] != 3
+                indices2 = indices if minmax else [2]
+
+                if cache is None:
                     total, chi, score, firsts, enough, enough2 = \
                         self.calculate_fraud(digit, series, indices2, minmax=minmax, subtract=True)
-                    self.log(
-                        f"TS {i:2} {digit} {str(indices):5} {state_id} {total:3} {chi:6.2f} {str(score):5}"
-                        f" {self.get_fraud(score, enough, enough2, 'X')} {firsts}")
-                    if not enough:
-                        continue
-                    ichi = int(chi * 100) / 100
-                    if score:
-                        frauds[indices[0]] |= 2
-                        if score > fraud_scores[1]:
-                            fraud_chis[digit + 1] = ichi
-                            fraud_scores[digit + 1] = int(score * 100) / 100
-                    fraud_data.append([1, digit, indices, total, ichi, score, firsts])
-
-                    # fraud detected => try to isolate the time with a sliding window
-                    # - find worst case = high number surrounded by high numbers too
-                    if score < SCORE_DOUBT or not enough:
-                        continue
-                    length = len(series)
-                    if length < TIMESTEP * 1.3:
-                        continue
-
-                    best = 0
-                    betas = []
-
-                    for steps in (2, 3):
-                        alphas = []
-                        highest = -1
-                        interval = length / steps
-                        lowest = 101
-                        min_count = MIN_COUNTS[digit]
-                        delta = min_count - interval
-
-                        for i in range(steps):
-                            # interval
-                            start = i * interval
-                            end = start + interval
-                            if delta > 0:
-                                start -= delta / 2
-                                end += delta / 2
-                            if start < 0:
-                                end -= start
-                                start = 0
-                            if end > length:
-                                start += length - end
-                                end = length
-                            start = int(start)
-                            end = int(end + 0.5)
-
-                            # fraud
-                            # increase the interval if total is too low
-                            while 1:
-                                sub = series[start: end]
-                                total, chi, score, firsts, enough, enough2 = \
-                                    self.calculate_fraud(digit, sub, indices2, minmax=minmax, subtract=True)
-                                if total < min_count and (start > 0 or end < length):
-                                    if start > 0:
-                                        start -= 1
-                                    if end < length:
-                                        end += 1
-                                else:
-                                    break
-
-                            if score > highest:
-                                highest = score
-                            if score < lowest:
-                                lowest = score
-
-                            # first date is wrong => get the second one
-                            first = series[start]
-                            second = series[start + 1]
-                            second_date = second[7]
-                            first_date = min(first[7], second[7])
-
-                            last = series[end - 1]
-                            alphas.append([
-                                3, digit, indices, total, int(chi * 100) / 100, score, firsts, start, end, first_date,
-                                last[7], [first[0], first[3]], [last[0], last[3]]])
-
-                        if highest < best * 1.02:
-                            break
-                        if highest > best:
-                            best = highest
-                        # not much difference between highest & lowest => not interesting
-                        if highest > lowest + 0.15:
-                            betas = alphas[:]
-
-                    # show results
-                    for _, _, _, total, ichi, score, firsts, start, end, time_start, time_end, first, last in betas:
-                        self.log(
-                            f"      {digit}  {start:3}-{end:3} {total:3} {chi:6.2f} {str(score):5}"
-                            f" {self.get_fraud(score, enough, enough2, '.')} {str(firsts):48}"
-                            f" {time_start} -> {time_end} {first} -> {last}")
-
-                    if best >= 0.9:
-                        fraud_data.extend(betas)
-
-            self.calculate_score(state_id, cands, fraud_data)
-
-        # 3) finish + total + timestamp
-        total = [0] * 9
-        for i, (code, state) in enumerate(states.items()):
-            for j in range(8):
-                total[j] += state[j]
-            # print(i, code, state)
-
-        stamp = meta.get('timestamp')
-        if stamp:
-            total[8] = int(datetime.fromisoformat(stamp.replace('Z', '+00:00')).timestamp())
+                else:
+                    key = f'{digit}{indices[0]}'
+                    counts, cache['counts'][key] = count_series(
+                        digit, series, indices2, minmax=minmax, checkpoints=checkpoints.get(key), first=num_same)
+                    total, chi, score, firsts, enough, enough2 = score_counts(digit, counts[:10], int(counts[10]))
+                    PROFILER.count('benford_tests')
+                self.log(
+                    'TS {:2} {} {!s:5} {} {:3} {:6.2f} {!s:5} {} {}', i, digit, indices, state_id, total, chi, score,
+                    self.get_fraud(score, enough, enough2, 'X'), firsts)
+                if not enough:
+                    continue
+                ichi = int(chi * 100) / 100
+                if score:
+                    frauds[indices[0]] |= 2
+                    if score > fraud_scores[1]:
+                        fraud_chis[digit + 1] = ichi
+                        fraud_scores[digit + 1] = int(score * 100) / 100
+                fraud_data.append([1, digit, indices, total, ichi, score, firsts])
+
+                # fraud detected => try to isolate the time with a sliding window
+                # - find worst case = high number surrounded by high numbers too
+                if score < SCORE_DOUBT or not enough:
+                    continue
+                length = len(series)
+                if length < TIMESTEP * 1.3:
+                    continue
 
-        states['00'] = total
-        self.log(total)
+                mark2 = PROFILER.start()
+                best = 0
+                betas = []
+                prefix = PrefixCounts(digit, series, indices2, minmax=minmax, subtract=True)
+
+                for steps in (2, 3):
+                    alphas = []
+                    highest = -1
+                    interval = length / steps
+                    lowest = 101
+                    min_count = MIN_COUNTS[digit]
+                    delta = min_count - interval
+
+                    for i in range(steps):
+                        # interval
+                        start = i * interval
+                        end = start + interval
+                        if delta > 0:
+                            start -= delta / 2
+                            end += delta / 2
+                        if start < 0:
+                            end -= start
+                            start = 0
+                        if end > length:
+                            start += length - end
+                            end = length
+                        start = int(start)
+                        end = int(end + 0.5)
+
+                        # fraud
+                        # increase the interval if total is too low
+                        start, end = prefix.widen(start, end, min_count)
+                        total, chi, score, firsts, enough, enough2 = prefix.window(start, end)
+
+                        if score > highest:
+                            highest = score
+                        if score < lowest:
+                            lowest = score
+
+                        # first date is wrong => get the second one
+                        first = series[start]
+                        second = series[start + 1]
+                        second_date = second[7]
+                        first_date = min(first[7], second[7])
+
+                        last = series[end - 1]
+                        alphas.append([
+                            3, digit, indices, total, int(chi * 100) / 100, score, firsts, start, end, first_date,
+                            last[7], [first[0], first[3]], [last[0], last[3]]])
+
+                    if highest < best * 1.02:
+                        break
+                    if highest > best:
+                        best = highest
+                    # not much difference between highest & lowest => not interesting
+                    if highest > lowest + 0.15:
+                        betas = alphas[:]
+
+                # show results
+                for _, _, _, total, ichi, score, firsts, start, end, time_start, time_end, first, last in betas:
+                    self.log(
+                        '      {}  {:3}-{:3} {:3} {:6.2f} {!s:5} {} {!s:48} {} -> {} {} -> {}', digit, start, end, total,
+                        chi, score, self.get_fraud(score, enough, enough2, '.'), firsts, time_start, time_end, first,
+                        last, level=DEBUG)
+
+                if best >= 0.9:
+                    fraud_data.extend(betas)
+                PROFILER.stop('timeseries_benford/window_search', mark2, state_id)
+
+        self.calculate_score(state_id, cands, fraud_data)
+        PROFILER.stop('timeseries_benford', mark, state_id)
+        return state_id, cands, self.finish_cache(cache, cands, num_line) if cache else None
+
+    def analyse_table(self, i: int, state_id: str, cands: List[Any], digits: np.ndarray, kind: int=0):
+        """Benford tests of a table of d, r, l columns, 1 row per county (kind 0) or per day (kind 1)
+        - digits: see get_digit_table, all the tests come from a single calculate_table
+        - fills the frauds + fraud_data of cands, calculate_score is left to the caller
+        """
+        fraud_chis = cands[9]
+        fraud_scores = cands[10]
+        frauds = cands[12]
+        fraud_data = cands[13]
+
+        results = calculate_table(digits, COUNTY_INDICES)
+        PROFILER.count('benford_tests', 2 * len(COUNTY_INDICES))
+        for digit in (1, 2):
+            for j, indices in enumerate(COUNTY_INDICES):
+                total, chi, score, firsts, enough, enough2 = results[digit - 1][j]
+                self.log(
+                    '{} {:2} {} {:5} {} {:3} {:6.2f} {!s:5} {} {}', TABLE_LABELS[kind], i, digit, COUNTY_LABELS[j],
+                    state_id, total, chi, score, self.get_fraud(score, enough, enough2, 'X'), firsts)
+                if not enough:
+                    continue
+                ichi = int(chi * 100) / 100
+                if score:
+                    frauds[j] |= 1 << kind
+                    if score > fraud_scores[kind]:
+                        fraud_chis[digit - 1 + kind * 2] = ichi
+                        fraud_scores[digit - 1 + kind * 2] = int(score * 100) / 100
+                fraud_data.append([kind, digit, indices, total, ichi, score, firsts])
 
-        # log
-        if PRINT_LOG:
-            output = os.path.join(DATA_FOLDER, f'{year}.log')
-            write_text_safe(output, '\n'.join(self.lines))
-        self.lines = []
+    def analyse_year(self, year: int, which: int):
+        """Analyse a race of a year in the main process, --jobs 1
+        """
+        with PROFILER.stage('finish_year'):
+            self.finish_year(year, which, *self.prepare_year(year, which))
 
     def calculate_fraud(
             self,
@@ -315,85 +447,12 @@ class Antifraud:
             subtract: bool=False,
         ) -> Tuple[int, float, float, List[int], bool, bool]:
         """Calculate the probability to have a fraud
+        - --cache => memoized in FRAUD_CACHE
         """
-        benfords = BENFORDS[benford_id]
-        bid = benford_id - 1
-
-        # 1) get the 1st and 2nd digits
-        counts = Counter()
-        prev = [0, 0, 0, 0, 0, 0, 0, 0]
-        step = 3 if minmax else 1
-        total = 0
-
-        for datum in data:
-            for index in indices:
-                item = datum[index * step] if index >= 0 else datum
-                # subtract => handle ranges
-                if subtract:
-                    if minmax:
-                        offset = index * step
-                        a = prev
-                        d0 = datum[offset] - a[offset]
-                        dmin = datum[offset + 1] - a[offset + 1]
-                        dmax = datum[offset + 2] - a[offset + 2]
-                        if d0 < 1 or dmin < 1 or dmax < 1:
-                            continue
-
-                        item = 0
-                        sd0 = str(d0)
-                        ld0 = len(sd0)
-                        smin = str(dmin)
-                        lmin = len(smin)
-                        smax = str(dmax)
-                        lmax = len(smax)
-                        if ld0 <= bid or lmin <= bid or lmax <= bid or ld0 != lmin or ld0 != lmax:
-                            continue
-
-                        imin = min(d0, dmin, dmax)
-                        imax = max(d0, dmin, dmax)
-                        for i in range(10):
-                            x = imin + (imax - imin) * i / 9
-                            counts[int(str(x)[bid])] += 1
-
-                        total += 1
-                        continue
-                    else:
-                        a = prev[index * step] if index >= 0 else prev
-                        item -= a
-
-                # delta ready
-                if item < 1:
-                    continue
-                text = str(item)
-
-                if len(text) > bid:
-                    counts[int(text[bid])] += 10
-                    total += 1
-
-            prev = datum
-
-        counts = [int(counts[i] / 10 + 0.5) for i in range(10)]
-        num_digit = 9 if benford_id == 1 else 10
-
-        # 2) calculate chi-square
-        chi = 0
-        expects = [benfords[i] * total for i in range(10)]
-        if total:
-            for i in range(10 - num_digit, 10):
-                chi += (counts[i] - expects[i]) ** 2 / expects[i]
-
-        score = 0
-        for (square, xscore) in zip(CHI_SQUARES[num_digit - 1], CHI_SQUARES[0]):
-            if chi > square:
-                score = xscore
-
-        # need enough data, magic number = 30
-        enough = total >= ENOUGHS[1] * num_digit
-        enough2 = total >= ENOUGHS[2] * num_digit
-        if score and enough and False:
-            print(counts)
-            print(expects)
-        return total, chi, score, counts, enough, enough2
+        PROFILER.count('benford_tests')
+        if self.cache:
+            return FRAUD_CACHE.calculate(benford_id, data, indices, minmax=minmax, subtract=subtract)
+        return calculate_benford(benford_id, data, indices, minmax=minmax, subtract=subtract)
 
     def calculate_score(self, state_id: str, cands: List[Any], data: List[Any]):
         """Calculate the final fraud score for presentation (colors)
@@ -422,6 +481,13 @@ class Antifraud:
         cands[8] = best
         cands[11] = int(score * 100) / 100
 
+    def close_log(self):
+        """Flush + close the log file
+        """
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
     def collect_candidates(self, dico: Dict[str, Any]) -> Tuple[Any]:
         """Collect candidates: democrat + republican, in that order
         """
@@ -436,11 +502,11 @@ class Antifraud:
         missing_absentees = (state_total[7] == 0)
 
         # 2) candidates
+        self.register_candidates(dico)
         for cand in cands:
             party = PARTIES.get(cand.get('party_id'))
             if party is None:
                 continue
-            CANDIDATES[cand.get('candidate_key')] = party
             state_total[16][party] = cand.get('name_display')
             if cand.get('winner'):
                 state_total[14] = party
@@ -455,25 +521,23 @@ class Antifraud:
             if missing_absentees:
                 state_total[7] += absentees
 
-        # 3) counties votes
-        county_total = []
-        verify_total = [0, 0, 0, 0]
+        # 3) counties votes => columns + their digits
         counties = dico.get('counties') or []
-        for county in counties:
-            vector = [0, 0, 0, county.get('votes'), county.get('fips'), county.get('name')]
-
-            results = county.get('results') or []
-            for key, value in results.items():
+        columns = [[0] * len(counties) for _ in range(4)]
+        for i, county in enumerate(counties):
+            columns[3][i] = county.get('votes') or 0
+            for key, value in (county.get('results') or {}).items():
                 cand = CANDIDATES.get(key)
-                if cand is None:
-                    continue
-                vector[cand] = value
-                verify_total[cand] += value
+                if cand is not None:
+                    columns[cand][i] = value
 
-            county_total.append(vector)
+        county_total = Counties(
+            columns, [county.get('fips') for county in counties], [county.get('name') for county in counties])
+        county_total.digits = get_digit_table(county_total.columns[:3])
+        verify_total = county_total.columns.sum(axis=1)
 
         # 4) check for mismatch
-        if any(state_total[i] != verify_total[i] for i in (0, 1, 2, 3)) and False:
+        if np.any(np.array(state_total[:4]) != verify_total) and False:
             print(dico.get('state_id'))
             print(state_total)
             print(verify_total)
@@ -481,177 +545,150 @@ class Antifraud:
 
         return state_total, county_total
 
+    def collect_raws(self, timeseries: List[Any], lasts: List[int]) -> np.ndarray:
+        """Collect the windows of a timeseries, before the backtracking
+        - only D + R are kept: [d, dmin, dmax, r, rmin, rmax, votes, stamp]
+        - no share => same window as the previous row, the last row gets the final votes
+        """
+        num_serie = len(timeseries)
+        columns = np.zeros((len(SERIES_FIELDS), num_serie), dtype=np.int64)
+
+        # 1) collect all the shares, votes + timestamps as arrays
+        shares = np.full((2, num_serie), np.nan)
+        for i, serie in enumerate(timeseries):
+            for key, value in serie.get('vote_shares').items():
+                cand = CANDIDATES.get(key)
+                if cand is not None and cand <= 1:
+                    shares[cand, i] = value
+
+        votes = np.array([serie.get('votes') for serie in timeseries], dtype=np.int64)
+        columns[6] = votes
+        columns[7] = parse_stamps([serie.get('timestamp') for serie in timeseries])
+
+        # 2) create initial windows
+        for cand, share in enumerate(shares):
+            present = ~np.isnan(share)
+            windows = np.where(present, [
+                share * votes + 0.5,
+                np.maximum(share - 0.0005, 0) * votes + 0.5,
+                np.minimum(share + 0.0005, 1) * votes + 0.5,
+            ], 0).astype(np.int64)
+            if num_serie and present[-1]:
+                windows[:, -1] = lasts[cand]
+            indices = np.maximum.accumulate(np.where(present, np.arange(num_serie), -1))
+            columns[cand * 3: cand * 3 + 3] = np.where(indices >= 0, windows[:, indices], 0)
+        return columns
+
     def collect_timeseries(
             self,
             state_id: str,
             timeseries: List[Any],
             lasts: List[int],
-            ) -> List[Any]:
+            cache: Dict[str, Any]=None,             # incremental: receives the tail
+            previous: Dict[str, Any]=None,          # incremental: cache of the previous run
+            ) -> Series:
         """Collect and fix a timeseries
+        - only D + R are kept: [d, dmin, dmax, r, rmin, rmax, votes, stamp]
+        - incremental: if only points were added, the backtracking stops at the first row that is the same
+            as in the previous series, tail = length, votes + stamp of the last row, digest of the rows before it
         """
-        cumuls = [[0, 0, 0, 0, 0], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0], 0]
-        errors = []
-        num_serie = len(timeseries)
-        series = []
-
-        # 1) collect all the shares
-        # + create initial windows
-        for i, serie in enumerate(timeseries):
-            is_last = (i == num_serie - 1)
-            shares = serie.get('vote_shares')
-            votes = serie.get('votes')
-            cumuls[3] = votes
-
-            for key, value in shares.items():
-                cand = CANDIDATES.get(key)
-                if cand is None:
-                    continue
-
-                if is_last:
-                    value2 = lasts[cand]
-                    cumuls[cand] = [value2, value2, value2, value, 0]
-                else:
-                    cumuls[cand] = [
-                        int(value * votes + 0.5),
-                        int(max(0, value - 0.0005) * votes + 0.5),
-                        int(min(1, value + 0.0005) * votes + 0.5),
-                        value,
-                        0,
-                    ]
-
-            c0, c1, c2 = cumuls[:3]
-            if votes:
-                c2[0] = votes - c0[0] - c1[0]
-                c2[1] = votes - c0[2] - c1[2]
-                c2[2] = votes - c0[1] - c1[1]
-
-            stamp = int(datetime.fromisoformat(serie.get('timestamp').replace('Z', '+00:00')).timestamp())
-            series.append([c0[:], c1[:], c2[:], cumuls[3], stamp])
-
-        # 2) backtracking + narrow the windows
-        i = num_serie - 1
-        last = series[i]
-        while i >= 0:
-            serie = series[i]
-            b3 = last[3]
-            a3 = serie[3]
-            delta = b3 - a3
-
-            for a, b in zip(serie[:3], last[:3]):
-                # normal
-                if delta >= 0:
-                    a[1] = clamp(a[1], b[1] - delta, b[2])
-                    a[2] = clamp(a[2], b[1] - delta, b[2])
-                # removing votes
-                else:
-                    a[1] = clamp(a[1], b[1], b[2] - delta)
-                    a[2] = clamp(a[2], b[2], b[2] - delta)
-
-                a[0] = (a[1] + a[2] + 1) // 2
-                if a3:
-                    a[4] = int(a[0] / a3 * 1e6) / 1e6
-
-            last = serie
-            i -= 1
-
-        # 3) clean series
-        for i, serie in enumerate(series):
-            a = serie[0]
-            b = serie[1]
-            series[i] = [a[0], a[1], a[2], b[0], b[1], b[2], serie[3], serie[4]]
-
-        return series
+        columns = self.collect_raws(timeseries, lasts)
+        num_serie = columns.shape[1]
+        olds = None
+        start = 0
+
+        # 0) incremental => the same raw rows, but the last one, as the previous run
+        if cache is not None:
+            tail = previous.get('tail') if previous else None
+            if tail and 1 < (num_old := tail['length']) <= num_serie and \
+                    columns[6, num_old - 1] == tail['votes'] and columns[7, num_old - 1] == tail['stamp'] and \
+                    get_digest(columns[:, :num_old - 1]) == tail['digest']:
+                olds = previous['cands'][17].columns
+                start = num_old - 1
+            cache['tail'] = {
+                'digest': get_digest(columns[:, :num_serie - 1]),
+                'length': num_serie,
+                'stamp': int(columns[7, -1]) if num_serie else 0,
+                'votes': int(columns[6, -1]) if num_serie else 0,
+            }
+
+        # 1) backtracking + narrow the windows
+        for offset in (0, 3):
+            narrow_windows(
+                *columns[offset: offset + 3], columns[6],
+                olds=None if olds is None else olds[offset: offset + 3], start=start)
+        return Series(columns)
 
     def compare_all_series(self):
-        """Compare time series between president + senate
+        """Align the time series of the other races on the first race + count the corrections of the first race
+        - 1 pass over the states, any number of races
         """
-        if len(self.states) < 2:
+        if not self.states:
             return
 
-        # 1) compare series
-        keys = [key for key in self.states[0] if key != '00' and key in self.states[1]]
-        for key in keys:
-            self.compare_series(key)
-
-        # 2) check how many corrections there were
         for state_id, value in self.states[0].items():
             if state_id == '00':
                 continue
+
+            # 1) align the series
+            self.compare_series(state_id)
+
+            # 2) check how many corrections there were
             diff = abs(value[0] - value[1])
             error = 0
             num_error = 0
-            prev = [0] * 8
-            total = value[3]
-
-            for serie in value[17]:
-                for i in (0, 3):
-                    delta = serie[i] - prev[i]
-                    if delta < 0:
-                        error -= delta
-                        num_error += 1
-                prev = serie
+            series = value[17]
+            if len(series):
+                deltas = np.diff(series.columns[[0, 3]], axis=1, prepend=0)
+                negatives = deltas[deltas < 0]
+                error = -int(negatives.sum())
+                num_error = len(negatives)
 
             value[18] = int(error * 100 / diff * num_error / (num_error + 2) * 100) / 100 if diff > 0 else 0
-            # print(state_id, num_error, error, total, error * 100 / total, error * 100 / diff, value[18])
 
     def compare_series(self, state_id: str):
-        """Compare 2 series
+        """Align the series of a state in the other races on the one of the first race
+        - the aligned series is an index map on the original rows, see align_stamps
+        - empty first series => the other series are emptied too
         """
         states = self.states
-        s1 = states[0][state_id][17]
-        s2 = states[1][state_id][17]
-        s3 = []
-        num1 = len(s1)
-        num2 = len(s2)
-
-        # 1) align s2 with s1
-        i = 0
-        j = 0
-        while i < num1:
-            # print(i, ' ', s1[i])
-            cur = s1[i][7]
-            if i + 1 < num1:
-                nxt = s1[i + 1][7]
-            else:
-                nxt = 0
-
-            while j < num2:
-                t2 = s2[j][7]
-                if abs(t2 - cur) > abs(t2 - nxt):
-                    break
-                # print(' ', j, s2[j], t2 - cur, t2 - nxt)
-                j += 1
-
-            s3.append(s2[j if j < num2 else num2 - 1])
-            i += 1
-
-        states[1][state_id][17] = s3
+        series = states[0][state_id][17]
+        for race in states[1:]:
+            if not (value := race.get(state_id)):
+                continue
+            if not len(series):
+                value[17] = []
+            elif len(series2 := value[17]):
+                value[17] = series2.take(align_stamps(series.stamps, series2.stamps))
 
     def convert_file(self, filename: str):
         """Convert an HTML to JSON
+        - extract_script, then the regexes if it found nothing
         """
         print(filename)
-        text = read_text_safe(filename)
-        for regexp in (RE_SCRIPT_2012, RE_SCRIPT_2016, RE_SCRIPT_2020):
-            rematch = regexp.search(text)
-            if rematch:
-                break
-
-        if not rematch:
-            self.logger.warning({'status': 'convert_file__script_error', 'filename': filename})
-            return
+        dico = extract_script(filename)
+        if dico is None:
+            text = read_text_safe(filename)
+            for regexp in (RE_SCRIPT_2012, RE_SCRIPT_2016, RE_SCRIPT_2020):
+                rematch = regexp.search(text)
+                if rematch:
+                    break
 
-        data = rematch.group(1)
-        dico = None
-        try:
-            dico = json.loads(data)
-            if isinstance(dico, dict):
-                races = dico.get('races')
-                if races:
-                    dico = races
-        except Exception as e:
-            self.logger.warning({'status': 'convert_file__json_error', 'error': e, 'filename': filename})
-            return
+            if not rematch:
+                self.logger.warning({'status': 'convert_file__script_error', 'filename': filename})
+                return
+
+            data = rematch.group(1)
+            try:
+                dico = json.loads(data)
+            except Exception as e:
+                self.logger.warning({'status': 'convert_file__json_error', 'error': e, 'filename': filename})
+                return
+
+        if isinstance(dico, dict):
+            races = dico.get('races')
+            if races:
+                dico = races
 
         if not dico:
             return
@@ -660,16 +697,31 @@ class Antifraud:
         save_json_file(output, dico, indent=2, sort=True)
 
     def convert_folder(self):
-        """Convert HTML to JSON
+        """Convert HTML to JSON, the files in --jobs processes
+        - a file whose -html.json is newer is skipped
         """
         folder = DATA_FOLDER
         sources = os.listdir(folder)
+        filenames = []
         for source in sources:
             base, ext = os.path.splitext(source)
             if ext != '.html':
                 continue
             filename = os.path.join(folder, source)
-            if os.path.isfile(filename):
+            if not os.path.isfile(filename):
+                continue
+            output = os.path.join(folder, f'{base}-html.json')
+            if os.path.isfile(output) and os.path.getmtime(output) > os.path.getmtime(filename):
+                continue
+            filenames.append(filename)
+
+        jobs = min(self.get_jobs(), len(filenames))
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for _ in executor.map(convert_file_job, filenames):
+                    pass
+        else:
+            for filename in filenames:
                 self.convert_file(filename)
 
     def create_empty(self) -> List[Any]:
@@ -691,6 +743,31 @@ class Antifraud:
             0,                      # 18: tab fraud
         ]
 
+    def create_tasks(
+            self,
+            states: Iterator[Dict[str, Any]],
+            candidates: Dict[str, int],
+            caches: str=None,                       # incremental: folder of the caches of the race
+            ) -> Iterator[Tuple[Any, ...] or Future]:
+        """Create the worker tasks of a race
+        - candidates = CANDIDATES when the race started, + the candidates of the race, in order
+        - incremental: unchanged state => no task, but a Future with the results of the previous run
+        """
+        for i, state in enumerate(states):
+            self.register_candidates(state, candidates)
+            self.register_candidates(state)
+
+            previous = None
+            if caches is not None:
+                previous = self.load_state_cache(caches, state.get('state_id'))
+                if previous.get('fingerprint') == self.get_state_fingerprint(state, candidates):
+                    future = Future()
+                    future.set_result((state.get('state_id'), previous['cands'], previous['lines'], None, None))
+                    yield future
+                    continue
+
+            yield i, state, dict(candidates), previous, FRAUD_CACHE.filename if self.cache else None
+
     def download_covid(self):
         """Download covid-19 data
         + calculate Benford + chi2
@@ -701,27 +778,47 @@ class Antifraud:
         for i, count in enumerate(MIN_COUNTS):
             MIN_COUNTS[i] = count // 2
 
-        url = DOWNLOADS.get('covid')
-        text = self.request_text(url)
-        countries = sorted(set(RE_COUNTRIES.findall(text)))
+        url = self.get_covid_url('covid')
+        text, changed = self.request_changed(url)
+        if not text:
+            return
+        names = sorted(set(RE_COUNTRIES.findall(text)))
+        countries = {name: self.find_country(name) for name in names}
         num_print = 0
         stats = {}
 
-        for name in countries:
+        # unchanged page => reuse the previous stats
+        output = os.path.join(DATA_FOLDER, 'covid.json')
+        previous = open_json_file(output)
+        previous = previous[0] if isinstance(previous, list) and previous else {}
+
+        # the country pages are downloaded concurrently, but processed in order
+        pages = self.get_fetcher().fetch_many(
+            self.get_covid_url('covid-country').replace('{COUNTRY}', name)
+            for name in names if countries[name])
+
+        for name in names:
             if num_print:
                 print(' ', end='')
             print(name, end='', flush=True)
             num_print += 1
 
             # 1) identify the country
-            country = self.find_country(name)
+            country = countries[name]
             if not country:
                 print('???', end='', flush=True)
                 continue
 
             # 2) get country data
-            url = DOWNLOADS.get('covid-country').replace('{COUNTRY}', name)
-            text = self.request_text(url)
+            url, text, page_changed = next(pages)
+            if not text:
+                changed = True
+                continue
+            code = country[1].lower()
+            if not page_changed and code in previous:
+                stats[code] = previous[code]
+                continue
+            changed = True
             series = RE_SERIES.findall(text)
             covid_cases = [[], [], []]
             dones = set()
@@ -757,12 +854,11 @@ class Antifraud:
             fraud_scores = cands[10]
             frauds = cands[12]
             fraud_data = cands[13]
-            code = country[1].lower()
 
             for digit in (1, 2):
                 total, chi, score, firsts, enough, enough2 = self.calculate_fraud(digit, covid_cases[0], [-1])
                 text = self.get_fraud(score, enough, enough2, 'X')
-                self.log(f"{code:3} {digit} 2 {total:3} {chi:6.2f} {str(score):5} {text} {firsts}")
+                self.log('{:3} {} 2 {:3} {:6.2f} {!s:5} {} {}', code, digit, total, chi, score, text, firsts)
                 ichi = int(chi * 100) / 100
                 if score:
                     frauds[3] |= 1
@@ -775,26 +871,70 @@ class Antifraud:
             stats[code] = cands
 
         # 3) totals
+        if not changed and stats.keys() | {'00'} == previous.keys():
+            print(f'\nunchanged: {output}')
+            self.save_cache()
+            return
+
         total = [0] * 9
         total[8] = int(datetime.now(tz=timezone.utc).timestamp())
         stats['00'] = total
 
-        output = os.path.join(DATA_FOLDER, 'covid.json')
-        save_json_file(output, [stats], indent=2, sort=True)
+        self.save_output(output, [stats])
+        self.save_cache()
 
     def download_president(self):
         """Download data from a source
         """
         url = DOWNLOADS.get(self.download)
-        text = self.request_text(url)
+        text, changed = self.request_changed(url)
+        if not text:
+            return
         output = os.path.join(DATA_FOLDER, f'2020-president-data.json')
-        print(f'downloaded {len(text)} bytes to {output}')
-        write_text_safe(output, text)
+        if not changed and os.path.isfile(output):
+            print(f'unchanged: {output}')
+        else:
+            print(f'downloaded {len(text)} bytes to {output}')
+            write_text_safe(output, text)
+
+        # archive mode => add the snapshot to the history
+        if self.archive:
+            try:
+                data = json.loads(text)
+            except ValueError as e:
+                self.logger.error({'status': 'download_president__error', 'error': e})
+                return
+            archive = Archive(self.get_archive_folder(output))
+            if archive.add(data):
+                print(f'archived {len(archive.get_index())} snapshots in {archive.folder}')
+
+    def emit(self, level: int, text: Any, args: tuple):
+        """Format a log record + send it to the sinks: console if PRINT_LOG, file if open_log
+        """
+        if level < self.log_level or not (PRINT_LOG or self.log_file):
+            return
+        line = text.format(*args) if args else str(text)
+        if PRINT_LOG:
+            print(line)
+        if self.log_file:
+            self.log_file.write(line)
+            self.log_file.write('\n')
 
     def find_country(self, name: str) -> List[str] or None:
         """Find a country from the .csv list
+        - the usual names are 1 hit in country_aliases, the others go through the synonyms + rewrites
         """
+        if not self.countries:
+            self.load_countries()
         lower = name.lower()
+        if country := self.country_aliases.get(lower):
+            return country
+
+        return self.find_country_slow(lower)
+
+    def find_country_slow(self, lower: str) -> List[str] or None:
+        """Find a country from a lowercase name: synonyms, then without hyphens, then without spaces
+        """
         lower = COUNTRY_SYNONYMS.get(lower, lower)
         if country := self.countries.get(lower):
             return country
@@ -808,6 +948,90 @@ class Antifraud:
             return country
         return None
 
+    def finish_cache(self, cache: Dict[str, Any], cands: List[Any], num_line: int) -> Dict[str, Any]:
+        """Add the results + log records of a state to its cache
+        - main process => the records were already emitted, they're only kept in the cache
+        """
+        cache['cands'] = cands
+        cache['lines'] = self.records[num_line:]
+        if not self.buffered:
+            del self.records[num_line:]
+        self.recording = False
+        return cache
+
+    def finish_year(self, year: int, which: int, meta: Dict[str, Any], results: Iterator[Any] or None):
+        """Collect the results of prepare_year, in the order of the states
+        + total + timestamp
+        """
+        print(f'analyse_year: {year} {which}')
+        if results is None:
+            return
+
+        # 1) states, incremental => only the caches of the states that changed are written
+        folder = self.get_cache_name(year, which)
+        states = self.states[which]
+        for state_id, cands, records, cache, extras in results:
+            if extras:
+                FRAUD_CACHE.merge(extras['fraud'])
+                PROFILER.merge(extras['profile'])
+            states[state_id] = cands
+            for level, text, args in records:
+                self.emit(level, text, args)
+            if cache is not None:
+                write_text_safe(
+                    os.path.join(folder, f'{state_id}.pkl'), pickle.dumps(cache, protocol=pickle.HIGHEST_PROTOCOL))
+
+        # states that are gone
+        if self.incremental and os.path.isdir(folder):
+            for name in os.listdir(folder):
+                if name.endswith('.pkl') and name[:-4] not in states:
+                    os.remove(os.path.join(folder, name))
+
+        # 2) finish + total + timestamp
+        total = [0] * 9
+        for i, (code, state) in enumerate(states.items()):
+            for j in range(8):
+                total[j] += state[j]
+            # print(i, code, state)
+
+        stamp = meta.get('timestamp')
+        if stamp:
+            total[8] = int(datetime.fromisoformat(stamp.replace('Z', '+00:00')).timestamp())
+
+        states['00'] = total
+        self.log(total)
+
+    def get_archive_folder(self, filename: str) -> str:
+        """Archive folder of a file, ex: data/archive/2020-president-data
+        """
+        return os.path.join(DATA_FOLDER, 'archive', os.path.splitext(os.path.basename(filename))[0])
+
+    def get_cache_name(self, year: int, which: int) -> str:
+        """Folder of the incremental caches of a race, 1 file per state: <state_id>.pkl
+        """
+        return os.path.join(DATA_FOLDER, f'{year}-{WHICH_NAMES[which]}-cache')
+
+    def get_covid_url(self, key: str) -> str:
+        """URL of a covid page, the base can be replaced by --covid-url, ex: a local mirror
+        """
+        url = DOWNLOADS.get(key)
+        if self.covid_url:
+            url = url.replace(DOWNLOADS['covid'], self.covid_url.rstrip('/') + '/')
+        return url
+
+    def get_fetcher(self) -> Fetcher:
+        """Create the fetcher on first use, only the downloads need it
+        """
+        if not self.fetcher:
+            self.fetcher = Fetcher(
+                concurrency=self.concurrency,
+                rate=self.rate,
+                timeout=self.timeout,
+                folder=os.path.join(DATA_FOLDER, 'http-cache'),
+                ttl=self.ttl,
+            )
+        return self.fetcher
+
     def get_fraud(self, score: float, enough: bool, enough2: bool, marker: str) -> str:
         """Get a FRAUD text
         """
@@ -819,101 +1043,397 @@ class Antifraud:
             fraud = '     '
         return f"{fraud} {' ' if enough2 else marker}"
 
-    def go(self):
+    def get_ballot_store(self) -> BallotStore or None:
+        """Open the store of the PA voter file, ingested first if missing or older than the file
+        """
+        if self.ballot_store:
+            return self.ballot_store
+
+        filename = self.file or os.path.join(
+            DATA_FOLDER, '2020_General_Election_Mail_Ballot_Requests_Department_of_State.csv')
+        output = os.path.join(DATA_FOLDER, 'pa-ballots.bin')
+        if not is_store_fresh(filename, output):
+            if not ingest_ballots(filename, output, jobs=self.get_jobs()):
+                return None
+        self.ballot_store = BallotStore(output)
+        return self.ballot_store
+
+    def get_jobs(self) -> int:
+        """Number of processes to analyse the states, 0 = all cores
+        """
+        jobs = self.jobs if self.jobs is not None else 1
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        return jobs
+
+    def get_state_fingerprint(self, state: Dict[str, Any], candidates: Dict[str, int]=None) -> str:
+        """Fingerprint of a state + of what its analysis depends on: the parties of its candidates, the parameters
+        - candidates: CANDIDATES by default, must already contain the candidates of the state
+        """
+        if candidates is None:
+            candidates = CANDIDATES
+        keys = {cand.get('candidate_key') for cand in state.get('candidates') or state.get('results') or []}
+        keys.update(key for county in state.get('counties') or [] for key in county.get('results') or {})
+        keys.update(key for serie in state.get('timeseries') or [] for key in serie.get('vote_shares') or {})
+        parties = sorted((str(key), candidates.get(key)) for key in keys)
+        return get_fingerprint([state, parties, ENOUGHS, MIN_COUNTS, SCORE_DOUBT, TIMESTEP, self.precision])
+
+    def go(self) -> bool:
         """Go!
+        - a malformed file => the year failed, nothing is saved
+        :return: True if the year was analysed + saved
         """
         year = self.year
         print(f'Go {year}')
-        self.analyse_year(year, 0)
-        self.analyse_year(year, 1)
-        self.compare_all_series()
+        self.open_log(os.path.join(DATA_FOLDER, f'{year}.log'))
+
+        # 1 job => 1 race after the other, in this process
+        # otherwise president + senate at the same time, at least 1 process per race
+        jobs = self.get_jobs()
+        parses = {}
+        try:
+            if jobs == 1:
+                for which in range(len(WHICH_NAMES)):
+                    self.analyse_year(year, which)
+            else:
+                jobs = max(jobs, len(WHICH_NAMES))
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    pendings = [
+                        self.prepare_year(year, which, executor=executor, jobs=jobs, parses=parses)
+                        for which in range(len(WHICH_NAMES))]
+                    parses.clear()
+                    for which, pending in enumerate(pendings):
+                        with PROFILER.stage('finish_year'):
+                            self.finish_year(year, which, *pending)
+        except ValueError as e:
+            self.logger.error({'status': 'go__error', 'error': e, 'year': year})
+            print(f'\n{year} failed: {e}')
+            return False
+        finally:
+            self.close_log()
+
+        with PROFILER.stage('compare_all_series'):
+            self.compare_all_series()
 
         # save json
-        output = os.path.join(DATA_FOLDER, f'{year}.json')
-        save_json_file(output, self.states, indent=2, sort=True)
+        with PROFILER.stage('save'):
+            output = os.path.join(DATA_FOLDER, f'{year}.json')
+            self.save_output(output, self.states, default=Series.tolist)
+            if self.binary:
+                self.save_binary(os.path.join(DATA_FOLDER, f'{year}.bin'))
+        self.save_cache()
+        return True
 
     def initialise(self):
         """Initialise some structures
+        - the countries are loaded on first use, see load_countries
         """
-        county_states = open_json_file(os.path.join(DATA_FOLDER, 'county_states.json'))
-
+        if self.cache:
+            FRAUD_CACHE.load(os.path.join(DATA_FOLDER, 'benford-cache.pkl'))
+
+    def load_countries(self):
+        """Load the countries, from the index data/countrycode.pkl if it's from the current .csv
+        - index: countries by lowercase code + name => [name, ISO2], the only columns used, + country_aliases = every name in lowercase, with hyphens,
+            spaces or none, of the countries + COUNTRY_SYNONYMS => the country, resolved with find_country_slow
+        - the index is rebuilt if the .csv, COUNTRY_SYNONYMS or the columns changed
+        """
+        num_column = 2
         # file exported from countrycode.org
         filename = os.path.join(DATA_FOLDER, 'countrycode.csv')
-        names = {}
+        output = os.path.join(DATA_FOLDER, 'countrycode.pkl')
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except OSError as e:
+            self.logger.error({'status': 'load_countries__error', 'error': e, 'filename': filename})
+            return
+
+        data = read_text_safe(output, want_bytes=True)
+        if data:
+            try:
+                index = pickle.loads(data)
+                if index.get('mtime') == mtime and index.get('synonyms') == COUNTRY_SYNONYMS and \
+                        index.get('columns') == num_column:
+                    self.countries = index['countries']
+                    self.country_aliases = index['aliases']
+                    return
+            except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+                self.logger.warning({'status': 'load_countries__index_error', 'error': e, 'filename': output})
+
+        countries = {}
         with open(filename, newline='') as csvfile:
             spamreader = csv.reader(csvfile, delimiter=',', quotechar='"')
             for row in spamreader:
-                code = row[1].lower()
-                self.countries[code] = row
-                self.countries[row[0].lower()] = row
-                names[code] = row[0]
+                row = row[:num_column]
+                countries[row[1].lower()] = row
+                countries[row[0].lower()] = row
+        self.countries = countries
+
+        aliases = {}
+        for name in [*countries, *COUNTRY_SYNONYMS, *COUNTRY_SYNONYMS.values()]:
+            for alias in (name, name.replace(' ', '-'), name.replace(' ', ''), name.replace('-', ' ')):
+                if alias not in aliases and (country := self.find_country_slow(alias)):
+                    aliases[alias] = country
+        self.country_aliases = aliases
+
+        write_text_safe(output, pickle.dumps(
+            {
+                'aliases': aliases, 'columns': num_column, 'countries': countries, 'mtime': mtime,
+                'synonyms': COUNTRY_SYNONYMS},
+            protocol=pickle.HIGHEST_PROTOCOL))
+
+    def load_state_cache(self, folder: str, state_id: str) -> Dict[str, Any]:
+        """Incremental cache of a state, {} if none
+        """
+        data = read_text_safe(os.path.join(folder, f'{state_id}.pkl'), want_bytes=True)
+        if not data:
+            return {}
+        try:
+            return pickle.loads(data)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            self.logger.warning({'status': 'load_state_cache__error', 'error': e, 'folder': folder, 'state': state_id})
+            return {}
+
+    def log(self, text: Any, *args, level: int=INFO):
+        """Log a line = text.format(*args), formatted only if a sink wants it
+        - worker process or incremental cache => the record (level, text, args) is kept, not the line
+        """
+        if self.buffered or self.recording:
+            self.records.append((level, text, args))
+        if not self.buffered:
+            self.emit(level, text, args)
 
-    def log(self, text: Any):
-        """Log on console + file
+    def open_log(self, filename: str):
+        """Stream the log to a file through a buffered writer, if --log or PRINT_LOG
         """
-        if PRINT_LOG:
-            print(text)
-        self.lines.append(text)
+        self.close_log()
+        if not (self.log_name or PRINT_LOG) or not makedirs_safe(os.path.dirname(filename)):
+            return
+        try:
+            self.log_file = open(filename, 'w', encoding='utf-8', buffering=1 << 16)
+        except OSError as e:
+            self.logger.error({'status': 'open_log__error', 'error': e, 'filename': filename})
 
     def pennsylvania(self):
-        """Count data from PA
-        """
-        DATE_INDICES = (2, 4, 5, 6, 7)
-        filename = os.path.join(DATA_FOLDER, '2020_General_Election_Mail_Ballot_Requests_Department_of_State.csv')
-        i = 0
-        county_stats = {}
-        dates = Counter()
-        parties = {}
-        stats = [0, 0]
-        with open(filename, newline='') as csvfile:
-            spamreader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            for row in spamreader:
-                # skip first + all non D/R
-                if i == 0 or row[1] not in {'D', 'R'}:
-                    i += 1
-                    continue
+        """Count data from PA: mail ballot requests by county, party + returned date
+        - the file is converted once to data/pa-ballots.bin, in --jobs processes, then queried, see query_ballots
+        """
+        if not self.get_ballot_store():
+            return
+        counts = self.ballot_store.report()
 
-                # fix the dates
-                for date_id in DATE_INDICES:
-                    date = row[date_id]
-                    if date:
-                        items = date.split('/')
-                        row[date_id] = '/'.join([items[2], items[0], items[1]])
-
-                date = row[7]
-                county_stat = county_stats.setdefault(row[0], [0, 0, 0, 0, 0, 0])
-                is_dem = (row[1] == 'D')
-                party = parties.setdefault(row[1], [0, 0])
-
-                county_stat[0] += 1
-                county_stat[2 if is_dem else 4] += 1
-
-                party[0] += 1
-                stats[0] += 1
-                if date:
-                    county_stat[1] += 1
-                    county_stat[3 if is_dem else 5] += 1
-                    party[1] += 1
-                    stats[1] += 1
-                    dates[date] += 1
-                if i % 10000 == 0:
-                    print(i, ', '.join(row))
-                i += 1
-                # if i > 100:
-                #     break
-
-        print(parties)
-        print(stats)
-        print(dates)
-        print(county_stats)
+        output = os.path.join(DATA_FOLDER, 'pa-ballots.json')
+        save_json_file(output, counts, indent=2, sort=True)
+        stats = counts['stats']
+        print(f'{stats[0]} requests, {stats[1]} returned, {len(counts["counties"])} counties => {output}')
 
-    def request_text(self, url: str) -> str or None:
-        """Get text data from an URL
+    def query_ballots(self, by: List[str]=(), **filters) -> Dict[Any, int] or None:
+        """Count the PA mail ballot requests, grouped by some fields, see BallotStore.count
+        - ex: query_ballots(['county'], returned=True, start='2020/10/01', end='2020/10/31')
         """
-        if not url:
+        if not self.get_ballot_store():
             return None
-        res = requests.get(url)
-        if res.status_code != 200:
-            self.logger.error({'status': 'download__error', 'status_code': res.status_code})
+        return self.ballot_store.count(by, **filters)
+
+    def prepare_year(
+            self,
+            year: int,
+            which: int,
+            executor: Executor=None,
+            jobs: int=1,                            # workers of the executor
+            parses: Dict[str, Any]=None,            # filename => stream, to parse a file shared by 2 races only once
+            ) -> Tuple[Dict[str, Any], Iterator[Any] or None]:
+        """Open the file of a year + start to analyse its states
+        - the states are streamed from the file, 1 at a time, and released once their results are collected
+        - executor => the first 2 * jobs states are submitted right away, the others as the results come in
+        - CANDIDATES is only modified in the main process, the workers get a snapshot
+        :return: meta (complete once the results are consumed), results = iterator of [state_id, cands, lines]
+        """
+        # 0) open files
+        which_name = WHICH_NAMES[which]
+        filename = self.file
+        if not filename:
+            if year == 2020:
+                for suffix in ('-1923', '-1921', ''):
+                    filename = os.path.join(DATA_FOLDER, f'{year}-{which_name}-data{suffix}.json')
+                    if os.path.isfile(filename):
+                        break
+                    else:
+                        filename = None
+        if not filename:
+            filename = os.path.join(DATA_FOLDER, f'{year}-{which_name}-html.json')
+
+        # 1) stream the states, the stream is shared if 2 races have the same file
+        if self.at:
+            meta = {}
+            races = self.rebuild_races(year, which, meta)
+            if races is None:
+                return {}, None
+        elif not os.path.isfile(filename):
+            self.logger.error({'status': 'analyse_year__error', 'filename': filename})
+            return {}, None
+        elif parses and filename in parses:
+            meta, races = parses.pop(filename)
+        else:
+            meta = {}
+            races = self.stream_races(filename, meta)
+            if parses is not None:
+                races, other = tee(races)
+                parses[filename] = (meta, other)
+        races = PROFILER.iterate('load', races)
+
+        # 2) parse all states
+        caches = self.get_cache_name(year, which) if self.incremental else None
+        if not executor:
+            return meta, (
+                (state_id, cands, [], cache, None)
+                for i, state in enumerate(races)
+                for state_id, cands, cache in [self.analyse_state(
+                    i, state,
+                    previous=None if caches is None else self.load_state_cache(caches, state.get('state_id')))])
+
+        tasks = self.create_tasks(races, dict(CANDIDATES), caches=caches)
+        return meta, iter_bounded(executor, analyse_state_job, tasks, jobs * 2)
+
+    def rebuild_races(self, year: int, which: int, meta: Dict[str, Any]) -> Iterator[Dict[str, Any]] or None:
+        """Rebuild the snapshot of a race at the timestamp --at, from its archive
+        - --file selects the archive, default = {year}-{race}-data
+        """
+        filename = self.file or f'{year}-{WHICH_NAMES[which]}-data.json'
+        archive = Archive(self.get_archive_folder(filename))
+        if not (at := parse_stamp(self.at)):
+            self.logger.error({'status': 'rebuild_races__at_error', 'at': self.at})
+            return None
+        stamp, data = archive.rebuild(at)
+        if data is None:
+            self.logger.error({'status': 'rebuild_races__error', 'folder': archive.folder, 'at': self.at})
             return None
-        return res.text
+
+        print(f'rebuilt {archive.folder} at {datetime.fromtimestamp(stamp, tz=timezone.utc).isoformat()}')
+        return self.stream_races(filename, meta, data=data)
+
+    def register_candidates(self, dico: Dict[str, Any], candidates: Dict[str, int]=None):
+        """Add the candidates of a state to CANDIDATES, or to another dictionary
+        """
+        if candidates is None:
+            candidates = CANDIDATES
+        for cand in dico.get('candidates') or dico.get('results') or []:
+            party = PARTIES.get(cand.get('party_id'))
+            if party is not None:
+                candidates[cand.get('candidate_key')] = party
+
+    def request_changed(self, url: str) -> Tuple[str or None, bool]:
+        """Get text data from an URL, using the HTTP cache
+        :return: text, changed (False = same as the previous download => the next steps can be skipped)
+        """
+        return self.get_fetcher().fetch_changed(url)
+
+    def request_text(self, url: str) -> str or None:
+        """Get text data from an URL
+        """
+        return self.get_fetcher().fetch(url)
+
+    def run(self, func: Callable):
+        """Run an action, ex: self.go
+        - --profile => timers + report in data/profile.json, + cProfile or tracemalloc
+        """
+        if not self.profile:
+            return func()
+
+        PROFILER.enable(self.profile)
+        result = PROFILER.run(func)
+        if self.cache:
+            PROFILER.counters['benford_tests_cached'] = FRAUD_CACHE.hits
+
+        output = os.path.join(DATA_FOLDER, 'profile.json')
+        PROFILER.save(output)
+        print(f'\n{PROFILER.table()}\n\nprofile saved to {output}')
+        return result
+
+    def save_binary(self, output: str):
+        """Save the results in a columnar file, 1 table per race, 1 row per state, see ColumnarFile
+        - fraud_data + series are ragged: 1 line per field, the rows of all states are concatenated + offsets
+        - fraud_data: FRAUD_FIELDS = type, digit, indices as bits, total, chi, score, 10 firsts,
+            + the window (type 3): start, end, time_start, time_end, first d, r, last d, r, or NaN
+        """
+        paddings = [np.nan] * (len(FRAUD_FIELDS) - 16)
+        tables = {}
+        for which, states in enumerate(self.states):
+            state_ids = [state_id for state_id in states if state_id != '00']
+            rows = [states[state_id] for state_id in state_ids]
+
+            fraud_data = [
+                [
+                    item[0], item[1], sum(1 << index for index in item[2]), *item[3:6], *item[6],
+                    *(item[7:11] + item[11] + item[12] if len(item) > 7 else paddings)]
+                for row in rows for item in row[13]]
+            series = [row[17] if isinstance(row[17], Series) else Series([]) for row in rows]
+
+            tables[WHICH_NAMES[which]] = {
+                'state_id': state_ids,
+                'votes': np.array([row[0:4] for row in rows], dtype=np.int64).reshape(-1, 4),
+                'absentees': np.array([row[4:8] for row in rows], dtype=np.int64).reshape(-1, 4),
+                'benford': np.array([row[8] for row in rows], dtype=np.float64),
+                'fraud_chis': np.array([row[9] for row in rows], dtype=np.float64).reshape(-1, 4),
+                'fraud_scores': np.array([row[10] for row in rows], dtype=np.float64).reshape(-1, 4),
+                'fraud': np.array([row[11] for row in rows], dtype=np.float64),
+                'frauds': np.array([row[12] for row in rows], dtype=np.int64).reshape(-1, 4),
+                'fraud_data': np.array(fraud_data, dtype=np.float64).reshape(-1, len(FRAUD_FIELDS)).T,
+                'fraud_data_offsets': get_offsets([len(row[13]) for row in rows]),
+                'winner': np.array([row[14] for row in rows], dtype=np.int64),
+                'electoral': np.array([row[15] for row in rows], dtype=np.int64),
+                'candidates': [name for row in rows for name in row[16]],
+                'series': np.concatenate(
+                    [serie.columns for serie in series] or [np.zeros((len(SERIES_FIELDS), 0), dtype=np.int64)],
+                    axis=1),
+                'series_offsets': get_offsets([len(serie) for serie in series]),
+                'tab_fraud': np.array([row[18] for row in rows], dtype=np.float64),
+                'total': np.array(states.get('00') or [0] * 9, dtype=np.int64),
+            }
+
+        save_columnar_file(output, tables, meta={'fields': SERIES_FIELDS, 'fraud_fields': FRAUD_FIELDS, 'year': self.year})
+
+    def save_cache(self):
+        """Save FRAUD_CACHE on disk + show its hit/miss counters
+        """
+        if not self.cache:
+            return
+        FRAUD_CACHE.save()
+        print(f'fraud cache: {FRAUD_CACHE.stats()}')
+
+    def save_output(self, output: str, data: Any, default: Callable=None):
+        """Save the results in the --format
+        - pretty: indented, for diffing
+        - compact: no spaces, --precision for the floats
+        - stream: compact, but written state by state
+        + --compress gz/br sidecars
+        """
+        kwargs = {'sort': True, 'default': default, 'precision': self.precision, 'compress': self.compress}
+        if self.format == 'stream':
+            save_json_stream(output, data, depth=2, **kwargs)
+        elif self.format == 'compact':
+            save_json_file(output, data, compact=True, **kwargs)
+        else:
+            save_json_file(output, data, indent=2, **kwargs)
+
+    def stream_races(self, filename: str, meta: Dict[str, Any], data: Any=None) -> Iterator[Dict[str, Any]]:
+        """Stream the races (= states) of a file, 1 at a time
+        - meta is filled while streaming: meta, or the root if there's no meta
+        - {meta, data: {races: [...]}}, {races: [...]} or [...]
+        - data => use it instead of the file, ex: a snapshot rebuilt from the archive
+        """
+        has_meta = False
+        source = None
+        items = iter_json_file(filename, JSON_PATHS) if data is None else iter_json_data(data, JSON_PATHS)
+        for path, value in items:
+            key = path[-1] if path else ''
+            if key == 'meta':
+                if value:
+                    has_meta = True
+                    meta.clear()
+                    meta.update(value)
+            elif key == 'timestamp':
+                if not has_meta:
+                    meta['timestamp'] = value
+            elif source in (None, path):
+                source = path
+                yield value
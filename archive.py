@@ -0,0 +1,221 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Archive: history of the snapshots of a file = 1 full base + 1 compressed JSON delta per snapshot
+"""
+
+from datetime import datetime, timezone
+import gzip
+import json
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from commoner import open_json_file, read_text_safe, save_json_file, write_text_safe
+
+
+# delta operations
+#   $a: append to a list
+#   $d: modify the keys of a dict, $x: delete keys
+#   $i: modify the items of a list with the same length
+#   $r: modify the races of a list, by state_id, $o: new order of the state_ids
+#   $s: set a new value
+
+
+class Archive:
+    """Snapshots of a file, indexed by timestamp
+    - index.json: [{stamp, file, size}, ...] in the order of arrival, the first file is the full base
+    - head.json.gz: the last snapshot, to compute the next delta without replaying the history
+    """
+    def __init__(self, folder: str):
+        self.folder = folder                            # type: str
+        self.index = None                               # type: List[Dict[str, Any]]
+
+    def add(self, data: Any, stamp: int=0) -> bool:
+        """Add a snapshot, stamp = 0 => get it from the data, or now
+        :return: True if added, False if unchanged
+        """
+        index = self.get_index()
+        if not stamp:
+            stamp = get_stamp(data) or int(datetime.now(tz=timezone.utc).timestamp())
+
+        if not index:
+            name = 'base.json.gz'
+            delta = data
+        else:
+            head = self.load('head.json.gz')
+            if head is None:
+                head = self.rebuild()[1]
+            if (delta := make_delta(head, data)) is None:
+                return False
+            name = f'delta-{len(index):05}.json.gz'
+
+        size = self.save(name, delta)
+        self.save('head.json.gz', data)
+        index.append({'stamp': stamp, 'file': name, 'size': size})
+        save_json_file(os.path.join(self.folder, 'index.json'), index)
+        return True
+
+    def get_index(self) -> List[Dict[str, Any]]:
+        """Load the index, once
+        """
+        if self.index is None:
+            index = open_json_file(os.path.join(self.folder, 'index.json'))
+            self.index = index if isinstance(index, list) else []
+        return self.index
+
+    def load(self, name: str) -> Any:
+        """Load a compressed JSON file of the archive
+        """
+        data = read_text_safe(os.path.join(self.folder, name), want_bytes=True)
+        if data is None:
+            return None
+        try:
+            return json.loads(gzip.decompress(data))
+        except (OSError, ValueError) as e:
+            logging.error({'status': 'archive_load__error', 'error': e, 'folder': self.folder, 'name': name})
+            return None
+
+    def rebuild(self, at: int=0) -> Tuple[int, Any]:
+        """Rebuild the last snapshot taken at or before the timestamp `at`, 0 = the last snapshot
+        :return: stamp, data (None if there's no such snapshot)
+        """
+        index = self.get_index()
+        last = -1
+        for i, entry in enumerate(index):
+            if not at or entry['stamp'] <= at:
+                last = i
+        if last < 0:
+            return 0, None
+
+        data = self.load(index[0]['file'])
+        for entry in index[1: last + 1]:
+            if data is None:
+                break
+            data = apply_delta(data, self.load(entry['file']))
+        return index[last]['stamp'], data
+
+    def save(self, name: str, data: Any) -> int:
+        """Save a compressed JSON file in the archive
+        :return: compressed size
+        """
+        code = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        compressed = gzip.compress(code.encode('utf-8'), compresslevel=9)
+        write_text_safe(os.path.join(self.folder, name), compressed)
+        return len(compressed)
+
+
+def apply_delta(old: Any, delta: Dict[str, Any]) -> Any:
+    """Apply a delta from make_delta, old can be modified in place
+    """
+    if not delta:
+        return old
+    if '$s' in delta:
+        return delta['$s']
+    if '$a' in delta:
+        old.extend(delta['$a'])
+        return old
+    if '$i' in delta:
+        for i, child in delta['$i'].items():
+            old[int(i)] = apply_delta(old[int(i)], child)
+        return old
+    if '$r' in delta:
+        races = {item['state_id']: item for item in old}
+        for state_id, child in delta['$r'].items():
+            races[state_id] = apply_delta(races.get(state_id), child)
+        order = delta.get('$o') or [item['state_id'] for item in old]
+        return [races[state_id] for state_id in order]
+
+    for key in delta.get('$x', []):
+        old.pop(key, None)
+    for key, child in delta['$d'].items():
+        old[key] = apply_delta(old.get(key), child)
+    return old
+
+
+def get_stamp(data: Any) -> int:
+    """Timestamp of a snapshot: meta.timestamp or timestamp, 0 if not found
+    """
+    if not isinstance(data, dict):
+        return 0
+    meta = data.get('meta')
+    stamp = meta.get('timestamp') if isinstance(meta, dict) else None
+    return parse_stamp(stamp or data.get('timestamp'))
+
+
+def is_races(items: List[Any]) -> bool:
+    """A list of races = dicts with unique state_ids
+    """
+    if not items or not all(isinstance(item, dict) and 'state_id' in item for item in items):
+        return False
+    return len(set(item['state_id'] for item in items)) == len(items)
+
+
+def make_delta(old: Any, new: Any) -> Dict[str, Any] or None:
+    """Delta to go from old to new, None if they're equal
+    - races are compared by state_id, lists that grow get the new items only
+    """
+    if old == new:
+        return None
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key, value in new.items():
+            if key not in old:
+                changes[key] = {'$s': value}
+            elif (child := make_delta(old[key], value)) is not None:
+                changes[key] = child
+        delta = {'$d': changes}
+        if deletes := [key for key in old if key not in new]:
+            delta['$x'] = deletes
+        return delta
+
+    if isinstance(old, list) and isinstance(new, list):
+        if is_races(old) and is_races(new):
+            races = {item['state_id']: item for item in old}
+            changes = {}
+            for item in new:
+                if (child := make_delta(races.get(item['state_id']), item)) is not None:
+                    changes[item['state_id']] = child
+            delta = {'$r': changes}
+            order = [item['state_id'] for item in new]
+            if order != [item['state_id'] for item in old]:
+                delta['$o'] = order
+            return delta
+
+        num_old = len(old)
+        if len(new) > num_old and new[:num_old] == old:
+            return {'$a': new[num_old:]}
+        if len(new) == num_old:
+            changes = {}
+            for i, (item, value) in enumerate(zip(old, new)):
+                if (child := make_delta(item, value)) is not None:
+                    changes[i] = child
+            # few changes => cheaper than a full copy
+            if len(changes) * 2 <= num_old:
+                return {'$i': changes}
+
+    return {'$s': new}
+
+
+def parse_stamp(text: Any) -> int:
+    """Convert a timestamp to seconds: 1604966400, '2020-11-10T00:00:00Z', '2020-11-10 00:00'
+    - no timezone => UTC
+    """
+    if not text:
+        return 0
+    if isinstance(text, (int, float)):
+        return int(text)
+    text = str(text).strip()
+    if text.isdigit():
+        return int(text)
+    try:
+        date = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError as e:
+        logging.error({'status': 'parse_stamp__error', 'error': e, 'text': text})
+        return 0
+    if not date.tzinfo:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
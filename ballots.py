@@ -0,0 +1,320 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Ballots: mail ballot requests of the PA voter file, converted once by chunks in parallel
+to an indexed columnar store, for the queries
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from datetime import date as Date, timedelta
+from functools import lru_cache
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from commoner import ColumnarFile, save_columnar_file
+
+
+# bytes per chunk, there are at least as many chunks as processes
+CHUNK_SIZE = 1 << 24
+
+# columns of the csv: only those are read
+COLUMN_APPROVED = 4
+COLUMN_COUNTY = 0
+COLUMN_MAILED = 6
+COLUMN_PARTY = 1
+COLUMN_RETURNED = 7
+NUM_COLUMN = 8
+
+# store: dates = day numbers since 1970-01-01
+DATE_FIELDS = {'approved': COLUMN_APPROVED, 'mailed': COLUMN_MAILED, 'returned': COLUMN_RETURNED}
+EPOCH = Date(1970, 1, 1)
+NO_DAY = -1
+
+PARTIES = {'D', 'R'}
+# Benford tests: the parties are merged into 3 groups, like the d, r, l of a race
+PARTY_GROUPS = ['D', 'R', 'others']
+
+
+class BallotStore:
+    """Mail ballot requests of a voter file, 1 row per request, read through a memory map, see ingest_ballots
+    - county + party: dictionary-encoded, dates: day numbers, NO_DAY = no date
+    - index: the rows are sorted by county then returned day, + county_offsets =>
+        a county is a slice, and a returned date range inside it is found by a binary search
+    """
+    def __init__(self, filename: str):
+        self.file = ColumnarFile(filename)
+        self.columns = {name: self.file.column('ballots', name) for name in self.file.names('ballots')}
+        self.counties = self.file.column('counties', 'name')   # type: List[str]
+        self.county_offsets = self.file.column('counties', 'offsets')
+        self.meta = self.file.header['meta']                # type: Dict[str, Any]
+        self.parties = self.file.column('parties', 'name')     # type: List[str]
+
+    def close(self):
+        """Release the map
+        """
+        self.columns = {}
+        self.file.close()
+
+    def count(self, by: List[str]=(), **filters) -> Dict[Any, int]:
+        """Count the requests matching the filters, grouped by some fields, see histogram
+        :return: {key: count}, key = tuple of the values of `by`, or the value itself if there's only 1 field
+        """
+        counts, labels = self.histogram(by, **filters)
+        if not labels:
+            return {(): int(counts)} if counts else {}
+
+        result = {}
+        for indices in zip(*(index.tolist() for index in np.nonzero(counts))):
+            key = tuple(names[index] for names, index in zip(labels, indices))
+            result[key[0] if len(key) == 1 else key] = int(counts[indices])
+        return result
+
+    def group_parties(self, counts: np.ndarray, axis: int=1) -> np.ndarray:
+        """Merge the party axis of a histogram into the PARTY_GROUPS
+        """
+        last = len(PARTY_GROUPS) - 1
+        groups = np.array(
+            [PARTY_GROUPS.index(party) if party in PARTY_GROUPS[:last] else last for party in self.parties],
+            dtype=np.int64)
+        return np.stack(
+            [counts.compress(groups == group, axis=axis).sum(axis=axis) for group in range(len(PARTY_GROUPS))],
+            axis=axis)
+
+    def histogram(
+            self,
+            by: List[str]=(),                   # group by: county, party, approved, mailed, returned
+            counties: List[str]=None,           # None = all
+            parties: List[str]=None,            # None = all
+            start: str=None,                    # returned on or after, ex: '2020/10/01'
+            end: str=None,                      # returned on or before
+            returned: bool=None,                # True = only the returned ballots, False = only the others
+            ) -> Tuple[np.ndarray, List[List[Any]]]:
+        """Count the requests matching the filters, grouped by some fields, as a dense array
+        - dates: consecutive days from the first to the last one, + None = missing date
+        :return: counts[code of by[0]][code of by[1]]..., labels = names of the codes of each field
+        """
+        # only the columns that are used are gathered
+        rows = self.select(counties, start, end)
+        keep = np.ones(len(self.columns['county'][rows]), dtype=bool)
+        if parties is not None:
+            codes = [self.parties.index(party) for party in parties if party in self.parties]
+            keep &= np.isin(self.columns['party'][rows], codes)
+        if returned is not None:
+            keep &= (self.columns['returned'][rows] != NO_DAY) == returned
+
+        # 1 code per group = mixed radix of the codes of the fields
+        codes = np.zeros(int(keep.sum()), dtype=np.int64)
+        labels = []
+        for name in by:
+            values = self.columns[name][rows][keep].astype(np.int64)
+            if name == 'county':
+                names = self.counties
+            elif name == 'party':
+                names = self.parties
+            else:
+                present = (values != NO_DAY)
+                first = int(values[present].min()) if present.any() else 0
+                values = np.where(present, values - first + 1, 0)
+                names = [None, *(get_date(first + day) for day in range(int(values.max(initial=0))))]
+            codes = codes * len(names) + values
+            labels.append(names)
+
+        shape = [len(names) for names in labels]
+        counts = np.bincount(codes, minlength=int(np.prod(shape, dtype=np.int64)))
+        return counts.reshape(shape), labels
+
+    def report(self) -> Dict[str, Any]:
+        """D + R requests by county, party + returned date
+        - county: [requests, returned, D requests, D returned, R requests, R returned]
+        - party: [requests, returned]
+        :return: {counties, dates, parties, stats}
+        """
+        parties = self.count(['party'], parties=PARTIES)
+        returns = self.count(['party'], parties=PARTIES, returned=True)
+        counties = {}
+        for (county, party), number in self.count(['county', 'party'], parties=PARTIES).items():
+            values = counties.setdefault(county, [0, 0, 0, 0, 0, 0])
+            values[0] += number
+            values[2 if party == 'D' else 4] += number
+        for (county, party), number in self.count(['county', 'party'], parties=PARTIES, returned=True).items():
+            values = counties[county]
+            values[1] += number
+            values[3 if party == 'D' else 5] += number
+
+        return {
+            'counties': counties,
+            'dates': self.count(['returned'], parties=PARTIES, returned=True),
+            'parties': {party: [number, returns.get(party, 0)] for party, number in parties.items()},
+            'stats': [sum(parties.values()), sum(returns.values())],
+        }
+
+    def select(self, counties: List[str]=None, start: str=None, end: str=None) -> np.ndarray or slice:
+        """Rows of some counties, returned between start and end, with the index
+        """
+        if counties is None and start is None and end is None:
+            return slice(None)
+
+        codes = range(len(self.counties)) if counties is None else [
+            self.counties.index(county) for county in counties if county in self.counties]
+        dated = (start is not None or end is not None)
+        first = NO_DAY + 1 if start is None else get_day(start)
+        last = None if end is None else get_day(end)
+        returns = self.columns['returned']
+        ranges = []
+        for code in codes:
+            begin, stop = int(self.county_offsets[code]), int(self.county_offsets[code + 1])
+            if dated:
+                days = returns[begin: stop]
+                if last is not None:
+                    stop = begin + int(np.searchsorted(days, last, side='right'))
+                begin += int(np.searchsorted(days, first, side='left'))
+            ranges.append(np.arange(begin, stop))
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+
+def encode_chunk(task: Tuple[str, int, int]) -> Dict[str, Any]:
+    """Encode all the requests of a byte range of the file, for the store
+    - county + party: codes into the dictionaries of the chunk, in the order of appearance
+    :return: {counties, parties, county, party, approved, mailed, returned}
+    """
+    filename, start, end = task
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    counties = {}
+    parties = {}
+    columns = {name: [] for name in ('county', 'party', *DATE_FIELDS)}
+    column_county = columns['county']
+    column_party = columns['party']
+    column_dates = [(columns[name], index) for name, index in DATE_FIELDS.items()]
+    for line in data.decode('utf-8', errors='replace').split('\n'):
+        line = line.rstrip('\r')
+        if '"' in line:
+            row = next(csv.reader([line]), [])
+        else:
+            row = line.split(',', NUM_COLUMN)
+        if len(row) < NUM_COLUMN:
+            continue
+
+        column_county.append(counties.setdefault(row[COLUMN_COUNTY], len(counties)))
+        column_party.append(parties.setdefault(row[COLUMN_PARTY], len(parties)))
+        for column, index in column_dates:
+            column.append(parse_day(row[index]) if row[index] else NO_DAY)
+
+    return {
+        'counties': list(counties),
+        'parties': list(parties),
+        **{name: np.array(column, dtype=np.int32) for name, column in columns.items()},
+    }
+
+
+def get_date(day: int) -> str:
+    """Day number => YYYY/MM/DD
+    """
+    return (EPOCH + timedelta(days=day)).strftime('%Y/%m/%d')
+
+
+def get_day(date: str) -> int:
+    """YYYY/MM/DD => day number
+    """
+    year, month, day = date.split('/')
+    return (Date(int(year), int(month), int(day)) - EPOCH).days
+
+
+def get_chunks(filename: str, jobs: int=1) -> List[Tuple[int, int]] or None:
+    """Split a file into byte ranges [start, end) that end on a line boundary, the header line is skipped
+    """
+    try:
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as file:
+            file.readline()
+            bounds = [file.tell()]
+            num_chunk = max(jobs, (size - bounds[0]) // CHUNK_SIZE + 1, 1)
+            for i in range(1, num_chunk):
+                file.seek(max(bounds[0] + (size - bounds[0]) * i // num_chunk, bounds[-1]) - 1)
+                file.readline()
+                bounds.append(file.tell())
+    except OSError as e:
+        logging.error({'status': 'get_chunks__error', 'error': e, 'filename': filename})
+        return None
+
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def ingest_ballots(filename: str, output: str, jobs: int=1) -> bool:
+    """Convert the voter file once to a columnar store, read by BallotStore
+    - the chunks are encoded in parallel, then their dictionaries are merged in the order of the file
+    - rows sorted by county then returned day, county_offsets[code] = 1st row of the county
+    - meta: size + mtime of the source => is_store_fresh
+    """
+    chunks = get_chunks(filename, jobs)
+    if chunks is None:
+        return False
+
+    tasks = [(filename, start, end) for start, end in chunks]
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            parts = list(executor.map(encode_chunk, tasks))
+    else:
+        parts = [encode_chunk(task) for task in tasks]
+
+    # local codes => global codes
+    counties = {}
+    parties = {}
+    columns = {name: [] for name in ('county', 'party', *DATE_FIELDS)}
+    for part in parts:
+        for key, names in (('county', counties), ('party', parties)):
+            local = part['counties' if key == 'county' else 'parties']
+            mapping = np.array([names.setdefault(name, len(names)) for name in local], dtype=np.int32)
+            columns[key].append(mapping[part[key]] if len(local) else part[key])
+        for name in DATE_FIELDS:
+            columns[name].append(part[name])
+
+    columns = {
+        name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int32) for name, arrays in columns.items()}
+    order = np.lexsort((columns['returned'], columns['county']))
+    columns = {name: column[order] for name, column in columns.items()}
+    offsets = np.zeros(len(counties) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(columns['county'], minlength=len(counties)), out=offsets[1:])
+
+    stat = os.stat(filename)
+    return save_columnar_file(
+        output,
+        {
+            'ballots': columns,
+            'counties': {'name': list(counties), 'offsets': offsets},
+            'parties': {'name': list(parties)},
+        },
+        meta={'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'source': os.path.basename(filename)},
+    )
+
+
+def is_store_fresh(filename: str, output: str) -> bool:
+    """The store was ingested from the current version of the voter file
+    """
+    try:
+        stat = os.stat(filename)
+        with ColumnarFile(output) as store:
+            meta = store.header['meta']
+    except (OSError, ValueError):
+        return False
+    return meta.get('mtime') == stat.st_mtime_ns and meta.get('size') == stat.st_size
+
+
+@lru_cache(maxsize=4096)
+def parse_day(date: str) -> int:
+    """MM/DD/YYYY => day number, NO_DAY if invalid, memoized as there are only a few hundred different dates
+    """
+    try:
+        month, day, year = date.split('/')
+        return (Date(int(year), int(month), int(day)) - EPOCH).days
+    except ValueError:
+        return NO_DAY
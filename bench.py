@@ -0,0 +1,583 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Benchmarks on synthetic nytimes-like races, offline
+
+python bench.py --states 50 --output data/bench.json
+python bench.py --baseline data/bench.json          # flag the slowdowns
+python bench.py --check                             # fast implementations = reference ones
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+import antifraud
+from antifraud import Antifraud, COUNTY_INDICES, MIN_COUNTS, WHICH_NAMES
+from ballots import PARTIES, BallotStore, get_date, ingest_ballots, parse_day
+from benford import PrefixCounts, calculate_benford, calculate_table, count_series, get_digit_table, score_counts
+from commoner import ColumnarFile, open_json_file, save_json_file
+from series import Series, align_stamps, align_stamps_loop, narrow_windows, narrow_windows_loop
+
+
+CANDIDATE_KEYS = [
+    [('bidenj', 'DEM', 'Biden'), ('trumpd', 'REP', 'Trump'), ('jorgensenj', 'LIB', 'Jorgensen')],
+    [('smithd', 'DEM', 'Smith'), ('jonesr', 'REP', 'Jones'), ('doel', 'libertarian', 'Doe')],
+]
+# slower than the baseline by this factor => flagged
+THRESHOLD = 1.25
+
+
+class Bench:
+    """Synthetic races + the timed functions
+    """
+    def __init__(self, **kwargs):
+        self.anomaly = kwargs.get('anomaly') or 0       # type: float
+        self.counties = kwargs.get('counties') or 80    # type: int
+        self.points = kwargs.get('points') or 900       # type: int
+        self.repeat = kwargs.get('repeat') or 5         # type: int
+        seed = kwargs.get('seed')
+        self.seed = 1 if seed is None else seed         # type: int
+        self.states = kwargs.get('states') or 10        # type: int
+
+        self.antifraud = Antifraud(buffered=True, year=2020)
+        self.folders = []                               # type: List[str]
+        self.races = [self.generate_race(which) for which in range(2)]
+        self.results = {}                               # type: Dict[str, Dict[str, float]]
+
+    def bench_calculate_fraud(self) -> Callable:
+        """The 8 county tests in 1 pass + calculate_fraud on the full time series
+        """
+        antifraud_ = self.antifraud
+        items = []
+        for state in self.races[0]['data']['races']:
+            cands, counties = antifraud_.collect_candidates(state)
+            series = antifraud_.collect_timeseries(state['state_id'], state['timeseries'], cands[:4])
+            items.append((counties, series))
+
+        def run():
+            for counties, series in items:
+                calculate_table(counties.digits, COUNTY_INDICES)
+                for digit in (1, 2):
+                    for indices in ([0], [1]):
+                        antifraud_.calculate_fraud(digit, series, indices, minmax=True, subtract=True)
+                    antifraud_.calculate_fraud(digit, series, [2], subtract=True)
+        return run
+
+    def bench_calculate_score(self) -> Callable:
+        """calculate_score of all the analysed states
+        """
+        antifraud_ = self.antifraud
+        states = self.get_analysed()[0]
+
+        def run():
+            for state_id, cands in states.items():
+                antifraud_.calculate_score(state_id, cands, cands[13])
+        return run
+
+    def bench_collect_timeseries(self) -> Callable:
+        """collect_timeseries: parse + backtracking
+        """
+        antifraud_ = self.antifraud
+        items = []
+        for state in self.races[0]['data']['races']:
+            cands, _ = antifraud_.collect_candidates(state)
+            items.append((state['state_id'], state['timeseries'], cands[:4]))
+
+        def run():
+            for state_id, timeseries, totals in items:
+                antifraud_.collect_timeseries(state_id, timeseries, totals)
+        return run
+
+    def bench_compare_series(self) -> Callable:
+        """compare_series between president + senate, the senate series are restored before each run
+        """
+        antifraud_ = self.antifraud
+        antifraud_.states = self.get_analysed()
+        seconds = {state_id: cands[17] for state_id, cands in antifraud_.states[1].items()}
+
+        def run():
+            for state_id, series in seconds.items():
+                antifraud_.states[1][state_id][17] = series
+            for state_id in antifraud_.states[0]:
+                if state_id in seconds:
+                    antifraud_.compare_series(state_id)
+        return run
+
+    def bench_go(self) -> Callable:
+        """Full go() in a temporary folder, 1 job
+        """
+        folder = tempfile.mkdtemp(prefix='bench-')
+        self.folders.append(folder)
+        self.save_races(folder)
+
+        def run():
+            cwd = os.getcwd()
+            os.chdir(folder)
+            try:
+                worker = Antifraud(jobs=1, year=2020)
+                worker.initialise()
+                worker.go()
+            finally:
+                os.chdir(cwd)
+        return run
+
+    def bench_window_search(self) -> Callable:
+        """Window search of analyse_state: prefix counts + 2 and 3 windows, widened to MIN_COUNTS
+        """
+        antifraud_ = self.antifraud
+        serieses = []
+        for state in self.races[0]['data']['races']:
+            cands, _ = antifraud_.collect_candidates(state)
+            serieses.append(antifraud_.collect_timeseries(state['state_id'], state['timeseries'], cands[:4]))
+
+        def run():
+            for series in serieses:
+                length = len(series)
+                for digit in (1, 2):
+                    min_count = MIN_COUNTS[digit]
+                    for indices in ([0], [1], [2]):
+                        prefix = PrefixCounts(digit, series, indices, minmax=indices[0] != 2, subtract=True)
+                        for steps in (2, 3):
+                            interval = length / steps
+                            for i in range(steps):
+                                start = int(i * interval)
+                                end = min(int(start + max(interval, min_count) + 0.5), length)
+                                start, end = prefix.widen(start, end, min_count)
+                                prefix.window(start, end)
+        return run
+
+    def check(self, names: List[str]=None) -> List[str]:
+        """Run the parity checks: the fast implementations must give the same results as the reference ones
+        :return: names of the failed checks
+        """
+        fails = []
+        for name in names or [name[6:] for name in sorted(dir(self)) if name.startswith('check_')]:
+            same = getattr(self, f'check_{name}')()
+            print(f'{name:20} {"OK" if same else "DIFFERENT"}', flush=True)
+            if not same:
+                fails.append(name)
+        return fails
+
+    def check_align_stamps(self) -> bool:
+        """align_stamps = align_stamps_loop
+        - the synthetic president + senate series, + random stamps: sorted, with duplicates, unsorted
+        """
+        rnd = random.Random(self.seed)
+        pairs = []
+        states = self.get_analysed()
+        for state_id, cands in states[0].items():
+            if state_id in states[1]:
+                pairs.append((cands[17].stamps, states[1][state_id][17].stamps))
+
+        for number in range(500):
+            stamps, stamps2 = [
+                np.array(sorted(rnd.randint(0, 5000) for _ in range(rnd.randint(0, 300))), dtype=np.int64)
+                for _ in range(2)]
+            if number % 2:
+                stamps = np.unique(stamps)
+            if number % 5 == 0:
+                stamps2 = stamps2[::-1].copy()
+            pairs.append((stamps, stamps2))
+
+        return all(
+            align_stamps(stamps, stamps2).tolist() == align_stamps_loop(stamps.tolist(), stamps2.tolist())
+            for stamps, stamps2 in pairs)
+
+    def check_ballot_store(self) -> bool:
+        """BallotStore.report + group-bys with filters = counted row by row
+        - random voter file: quoted fields, other parties, missing + unpadded dates, ingested by 1 and 3 processes
+        """
+        rnd = random.Random(self.seed)
+        folder = tempfile.mkdtemp(prefix='bench-')
+        self.folders.append(folder)
+        filename = os.path.join(folder, 'ballots.csv')
+        counties = ['ADAMS', 'BERKS', 'CHESTER', 'DELAWARE', '"LACKAWANNA, N"', 'YORK']
+        rows = []
+        for _ in range(3000):
+            dates = [
+                '' if rnd.random() < 0.2 else f'{rnd.choice((9, 10, 11))}/{rnd.randint(1, 28):0{rnd.choice((1, 2))}}/2020'
+                for _ in range(3)]
+            rows.append([
+                rnd.choice(counties), rnd.choice('DDRRNL'), '1/01/1960', 'OLREGV', dates[0], '', dates[1], dates[2],
+                'x', 'x', '1ST'])
+        with open(filename, 'w') as file:
+            file.write('County,Party,Birth,Type,Approved,Return,Mailed,Returned,House,Senate,Congress\n')
+            file.write(''.join(','.join(row) + '\n' for row in rows))
+
+        def day(text: str) -> str or None:
+            return get_date(parse_day(text)) if text else None
+
+        # report: D + R requests by county, party + returned date
+        counts = {'counties': {}, 'dates': {}, 'parties': {}, 'stats': [0, 0]}
+        for row in rows:
+            if row[1] not in PARTIES:
+                continue
+            county = counts['counties'].setdefault(row[0].strip('"'), [0, 0, 0, 0, 0, 0])
+            party = counts['parties'].setdefault(row[1], [0, 0])
+            offset = 2 if row[1] == 'D' else 4
+            returned = day(row[7])
+            for values, index in ((county, 0), (county, offset), (party, 0), (counts['stats'], 0)):
+                values[index] += 1
+                if returned:
+                    values[index + 1] += 1
+            if returned:
+                counts['dates'][returned] = counts['dates'].get(returned, 0) + 1
+
+        filters = dict(counties=['ADAMS', 'LACKAWANNA, N'], parties=['D', 'N'], start='2020/10/05', end='2020/11/09')
+        expected = {}
+        for row in rows:
+            county = row[0].strip('"')
+            returned = day(row[7])
+            if county in filters['counties'] and row[1] in filters['parties'] and returned and \
+                    filters['start'] <= returned <= filters['end']:
+                key = (county, day(row[4]))
+                expected[key] = expected.get(key, 0) + 1
+
+        for jobs in (1, 3):
+            output = os.path.join(folder, f'ballots-{jobs}.bin')
+            if not ingest_ballots(filename, output, jobs=jobs):
+                return False
+            store = BallotStore(output)
+            same = (store.report() == counts and store.count(['county', 'approved'], **filters) == expected)
+            store.close()
+            if not same:
+                return False
+        return True
+
+    def check_binary(self) -> bool:
+        """save_binary = the results of the analysis
+        - every field of fraud_data, the window fields are NaN for the items that aren't windows, + the series
+        """
+        states = self.get_analysed()
+        folder = tempfile.mkdtemp(prefix='bench-')
+        self.folders.append(folder)
+        output = os.path.join(folder, 'bench.bin')
+        self.antifraud.states = states
+        self.antifraud.save_binary(output)
+
+        with ColumnarFile(output) as columnar:
+            num_field = len(columnar.header['meta']['fraud_fields'])
+            for which, race in enumerate(states):
+                table = WHICH_NAMES[which]
+                for row, state_id in enumerate(columnar.column(table, 'state_id')):
+                    cands = race[state_id]
+                    values = columnar.ragged(table, 'fraud_data', row).T.tolist()
+                    if len(values) != len(cands[13]):
+                        return False
+                    for item, value in zip(cands[13], values):
+                        expected = [item[0], item[1], sum(1 << index for index in item[2]), *item[3:6], *item[6]]
+                        if len(item) > 7:
+                            expected.extend([*item[7:11], *item[11], *item[12]])
+                        if len(value) != num_field or value[:len(expected)] != expected or \
+                                not np.isnan(value[len(expected):]).all():
+                            return False
+                    if not np.array_equal(columnar.ragged(table, 'series', row), cands[17].columns):
+                        return False
+        return True
+
+    def check_count_series(self) -> bool:
+        """count_series = calculate_benford on the synthetic series
+        - incremental: with the checkpoints of a shorter series, whose last rows are different
+        """
+        rnd = random.Random(self.seed)
+        for race in self.races:
+            for state in race['data']['races']:
+                cands, _ = self.antifraud.collect_candidates(state)
+                series = self.antifraud.collect_timeseries(state['state_id'], state['timeseries'], cands[:4])
+                length = len(series)
+                for digit in (1, 2):
+                    for indices, minmax in (([0], True), ([1], True), ([2], False)):
+                        expected = calculate_benford(digit, series, indices, minmax=minmax, subtract=True)
+                        counts, _ = count_series(digit, series, indices, minmax=minmax)
+                        if score_counts(digit, counts[:10], int(counts[10])) != expected:
+                            return False
+                        if length < 2:
+                            continue
+
+                        num_old = rnd.randint(1, length)
+                        num_same = rnd.randint(0, num_old)
+                        olds = series.columns[:, :num_old].copy()
+                        olds[:, num_same:] += rnd.randint(1, 1000)
+                        _, checkpoints = count_series(digit, Series(olds), indices, minmax=minmax)
+                        counts, _ = count_series(
+                            digit, series, indices, minmax=minmax, checkpoints=checkpoints, first=num_same)
+                        if score_counts(digit, counts[:10], int(counts[10])) != expected:
+                            return False
+        return True
+
+    def check_county_table(self) -> bool:
+        """calculate_table = calculate_benford on each group of columns
+        - the synthetic counties + random votes: zeros, negatives, 1 digit
+        """
+        rnd = random.Random(self.seed)
+        tables = []
+        for race in self.races:
+            for state in race['data']['races']:
+                tables.append(self.antifraud.collect_candidates(state)[1].columns[:3])
+        for _ in range(100):
+            length = rnd.randint(0, 200)
+            tables.append(np.array(
+                [[rnd.choice((0, -5, rnd.randint(1, 9), rnd.randint(10, 10 ** 7))) for _ in range(length)]
+                 for _ in range(3)], dtype=np.int64).reshape(3, -1))
+
+        for columns in tables:
+            results = calculate_table(get_digit_table(columns), COUNTY_INDICES)
+            data = columns.T
+            for digit in (1, 2):
+                for j, indices in enumerate(COUNTY_INDICES):
+                    if results[digit - 1][j] != calculate_benford(digit, data, indices):
+                        return False
+        return True
+
+    def check_narrow_windows(self) -> bool:
+        """narrow_windows = narrow_windows_loop
+        - the windows of the synthetic series + random ones: smooth, noisy, with corrections, incremental
+        """
+        rnd = random.Random(self.seed)
+        windows = []
+        for race in self.races:
+            for state in race['data']['races']:
+                cands, _ = self.antifraud.collect_candidates(state)
+                raws = self.antifraud.collect_raws(state['timeseries'], cands[:4])
+                windows.extend((raws[offset: offset + 3], raws[6]) for offset in (0, 3))
+
+        for number in range(200):
+            length = rnd.randint(1, 3000)
+            noise = (0, 0.0003, 0.05)[number % 3]
+            counts = np.cumsum([rnd.randint(-100 if number % 4 == 0 else 0, 1000) for _ in range(length)])
+            shares = np.round([0.5 + 0.02 * np.sin(i / 200) + rnd.gauss(0, noise) for i in range(length)], 3)
+            windows.append((np.array([
+                (shares * counts + 0.5).astype(np.int64),
+                ((shares - 0.0005) * counts + 0.5).astype(np.int64),
+                ((shares + 0.0005) * counts + 0.5).astype(np.int64),
+            ]), counts.astype(np.int64)))
+
+        for columns, counts in windows:
+            fasts = columns.copy()
+            slows = columns.tolist()
+            narrow_windows(*fasts, counts)
+            narrow_windows_loop(*slows, counts.tolist())
+            if not np.array_equal(fasts, slows):
+                return False
+
+            # incremental: the previous run is the result, with a different last row
+            length = len(counts)
+            if length < 2:
+                continue
+            start = rnd.randint(1, length - 1)
+            olds = fasts
+            fasts = columns.copy()
+            fasts[1, -1] += rnd.randint(0, 1)
+            slows = fasts.tolist()
+            first = narrow_windows(*fasts, counts, olds=olds, start=start)
+            first2 = narrow_windows_loop(*slows, counts.tolist(), olds=olds, start=start)
+            if first != first2 or not np.array_equal(fasts, slows):
+                return False
+        return True
+
+    def compare(self, baseline: Dict[str, Any], threshold: float=THRESHOLD) -> List[str]:
+        """Compare the results with a baseline from a previous run
+        :return: names of the slower benchmarks
+        """
+        slowers = []
+        olds = baseline.get('results', {})
+        meta = baseline.get('meta', {})
+        for key in ('anomaly', 'counties', 'points', 'seed', 'states'):
+            if meta.get(key) != getattr(self, key):
+                print(f'warning: {key} = {getattr(self, key)}, baseline = {meta.get(key)}')
+        for name, result in self.results.items():
+            if not (old := olds.get(name)) or not old.get('best'):
+                continue
+            ratio = result['best'] / old['best']
+            flag = ''
+            if ratio > threshold:
+                flag = ' SLOWER'
+                slowers.append(name)
+            print(f'{name:20} {old["best"] * 1000:10.2f} -> {result["best"] * 1000:10.2f} ms {ratio:6.2f}x{flag}')
+        return slowers
+
+    def generate_race(self, which: int) -> Dict[str, Any]:
+        """Deterministic race with the same shape as the nytimes files
+        - anomaly = part of the counties + time steps whose digits are uniform instead of Benford
+        """
+        rnd = random.Random(self.seed * 2 + which)
+        keys = CANDIDATE_KEYS[which]
+        races = []
+
+        def distort(value: int) -> int:
+            if value < 10 or rnd.random() >= self.anomaly:
+                return value
+            size = len(str(value))
+            return rnd.randint(10 ** (size - 1), 10 ** size - 1)
+
+        for state in range(self.states):
+            # a) counties
+            counties = []
+            totals = [0, 0, 0]
+            for county in range(rnd.randint(self.counties // 2, self.counties)):
+                size = 10 ** rnd.uniform(2, 6)
+                votes = [
+                    distort(int(size * rnd.uniform(0.2, 0.7))),
+                    distort(int(size * rnd.uniform(0.2, 0.7))),
+                    int(size * rnd.uniform(0, 0.03)),
+                ]
+                for i, vote in enumerate(votes):
+                    totals[i] += vote
+                counties.append({
+                    'fips': f'{state:02}{county:03}',
+                    'name': f'County {county}',
+                    'votes': sum(votes),
+                    'results': {key[0]: vote for key, vote in zip(keys, votes)},
+                })
+
+            # b) candidates
+            total = sum(totals)
+            winner = 0 if totals[0] > totals[1] else 1
+            candidates = [
+                {
+                    'candidate_key': key, 'party_id': party, 'name_display': name, 'votes': totals[i],
+                    'absentee_votes': totals[i] // 3, 'winner': i == winner,
+                }
+                for i, (key, party, name) in enumerate(keys)]
+
+            # c) time series, with a few corrections (= votes going down)
+            timeseries = []
+            stamp = datetime(2020, 11, 4, tzinfo=timezone.utc)
+            num_point = rnd.randint(self.points // 3, self.points)
+            votes = 0
+            for i in range(num_point):
+                frac = (i + 1) / num_point
+                prev = votes
+                votes = int(total * frac ** 0.5) if i < num_point - 1 else total
+                if i < num_point - 1 and votes > prev:
+                    votes = prev + distort(votes - prev)
+                if timeseries and rnd.random() < 0.02:
+                    votes = max(0, prev - rnd.randint(0, 1000))
+                stamp += timedelta(seconds=rnd.randint(10, 600))
+                timeseries.append({
+                    'vote_shares': {
+                        keys[0][0]: round(totals[0] / total + rnd.uniform(-0.05, 0.05) * (1 - frac), 3),
+                        keys[1][0]: round(totals[1] / total + rnd.uniform(-0.05, 0.05) * (1 - frac), 3),
+                        keys[2][0]: round(totals[2] / total, 3),
+                    },
+                    'votes': votes,
+                    'eevp': 0,
+                    'timestamp': stamp.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                })
+
+            races.append({
+                'state_id': f'{state + 1:02}',
+                'votes': total,
+                'absentee_votes': total // 3,
+                'electoral_votes': 10,
+                'candidates': candidates,
+                'counties': counties,
+                'timeseries': timeseries,
+            })
+
+        return {'meta': {'timestamp': '2020-11-10T12:00:00Z'}, 'data': {'races': races}}
+
+    def get_analysed(self) -> List[Dict[str, List[Any]]]:
+        """Analyse the states of both races
+        """
+        states = [{}, {}]
+        for which, race in enumerate(self.races):
+            for i, state in enumerate(race['data']['races']):
+                state_id, cands, _ = self.antifraud.analyse_state(i, state)
+                states[which][state_id] = cands
+        return states
+
+    def run(self, names: List[str]=None):
+        """Run the benchmarks: best + median of `repeat` runs
+        """
+        for name in names or [name[6:] for name in sorted(dir(self)) if name.startswith('bench_')]:
+            func = getattr(self, f'bench_{name}')()
+            times = []
+            for _ in range(self.repeat):
+                start = perf_counter()
+                func()
+                times.append(perf_counter() - start)
+
+            self.results[name] = {'best': min(times), 'median': float(np.median(times)), 'repeat': len(times)}
+            print(f'{name:20} {min(times) * 1000:10.2f} ms', flush=True)
+
+        for folder in self.folders:
+            shutil.rmtree(folder, ignore_errors=True)
+        self.folders.clear()
+
+    def save(self, filename: str):
+        """Save the results + the parameters, to compare with a later run
+        """
+        save_json_file(filename, {
+            'meta': {
+                'anomaly': self.anomaly,
+                'counties': self.counties,
+                'date': datetime.now(tz=timezone.utc).isoformat(),
+                'numpy': np.__version__,
+                'points': self.points,
+                'python': platform.python_version(),
+                'seed': self.seed,
+                'states': self.states,
+            },
+            'results': self.results,
+        }, indent=2, sort=True)
+
+    def save_races(self, folder: str):
+        """Save the races as data/2020-president-data.json + data/2020-senate-data.json in a folder
+        """
+        data_folder = os.path.join(folder, antifraud.DATA_FOLDER)
+        for which, race in enumerate(self.races):
+            save_json_file(os.path.join(data_folder, f'2020-{antifraud.WHICH_NAMES[which]}-data.json'), race)
+
+
+def main():
+    parser = ArgumentParser(description='Benchmarks', prog='python bench.py')
+    add = parser.add_argument
+
+    add('--anomaly', nargs='?', default=0, type=float, help='part of the numbers with non Benford digits')
+    add('--baseline', nargs='?', help='results of a previous run, to flag the slowdowns')
+    add('--check', action='store_true', help='check that the fast implementations match the reference ones')
+    add('--counties', nargs='?', default=80, type=int, help='max counties per state')
+    add('--data', nargs='?', help='only save the synthetic races in this folder, ex: /tmp/bench')
+    add('--names', nargs='*', help='benchmarks to run, default = all')
+    add('--output', nargs='?', help='save the results, ex: data/bench.json')
+    add('--points', nargs='?', default=900, type=int, help='max points per time series')
+    add('--repeat', nargs='?', default=5, type=int, help='runs per benchmark')
+    add('--seed', nargs='?', default=1, type=int, help='random seed')
+    add('--states', nargs='?', default=10, type=int, help='number of states')
+    add('--threshold', nargs='?', default=THRESHOLD, type=float, help='slower by this factor => flagged')
+
+    args = parser.parse_args()
+    bench = Bench(**vars(args))
+    if args.data:
+        bench.save_races(args.data)
+        return
+    if args.check:
+        if fails := bench.check(args.names):
+            print(f'\nDIFFERENT: {", ".join(fails)}')
+            sys.exit(1)
+        return
+
+    bench.run(args.names)
+    if args.output:
+        bench.save(args.output)
+    if args.baseline:
+        if slowers := bench.compare(open_json_file(args.baseline), args.threshold):
+            print(f'\nSLOWER: {", ".join(slowers)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
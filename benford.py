@@ -0,0 +1,511 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Benford engine: digit extraction + histogram + chi-square over whole columns
+"""
+
+from collections import OrderedDict
+from hashlib import blake2b
+import logging
+from math import log10
+import pickle
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from commoner import read_text_safe, write_text_safe
+from counties import Counties
+from pvalue import get_score, get_scores
+from series import Series
+
+
+# https://en.wikipedia.org/wiki/Benford%27s_law
+BENFORDS = [
+    [],
+    [log10(1 + 1 / n) if n > 0 else 0 for n in range(10)],
+    [0.12, 0.114, 0.109, 0.104, 0.10, 0.097, 0.093, 0.09, 0.088, 0.085],
+    [0.102, 0.101, 0.101, 0.101, 0.100, 0.100, 0.099, 0.099, 0.099, 0.098],
+]
+
+ENOUGHS = [0, 17, 27]
+
+# 1, 10, 100, ... => number of digits = searchsorted(POW10, value, 'right')
+POW10 = np.array([10 ** i for i in range(19)], dtype=np.int64)
+STEPS = np.arange(10, dtype=np.int64)
+
+
+class BenfordCache:
+    """LRU cache of calculate_benford, keyed on a hash of the parameters + of the columns that are read
+    - filename: optional on-disk store, see load + save
+    - in a worker process: pop_news gives the new entries + counters, to be merged in the main process
+    """
+    __slots__ = ('entries', 'filename', 'hits', 'misses', 'news', 'size')
+
+    def __init__(self, size: int=16384, filename: str=None):
+        self.entries = OrderedDict()                    # type: OrderedDict
+        self.filename = filename                        # type: str
+        self.hits = 0                                   # type: int
+        self.misses = 0                                 # type: int
+        self.news = {}                                  # type: Dict[bytes, Any]
+        self.size = size                                # type: int
+
+    def calculate(
+            self,
+            benford_id: int,
+            data: List[Any] or np.ndarray,
+            indices: List[int],
+            minmax: bool=False,
+            subtract: bool=False,
+            ) -> Tuple[int, float, float, List[int], bool, bool]:
+        """Cached calculate_benford
+        """
+        key = self.get_key(benford_id, data, indices, minmax, subtract)
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            result = calculate_benford(benford_id, data, indices, minmax=minmax, subtract=subtract)
+            self.store(key, result)
+            if self.filename:
+                self.news[key] = result
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        # the caller can keep the counts => give a copy
+        total, chi, score, counts, enough, enough2 = result
+        return total, chi, score, list(counts), enough, enough2
+
+    @staticmethod
+    def get_key(
+            benford_id: int,
+            data: List[Any] or np.ndarray,
+            indices: List[int],
+            minmax: bool,
+            subtract: bool,
+            ) -> bytes:
+        """Hash of the parameters + of the columns read by collect_digits
+        """
+        # ENOUGHS can be modified, ex: covid
+        params = (benford_id, indices, minmax, subtract, len(data), ENOUGHS)
+        hasher = blake2b(repr(params).encode(), digest_size=16)
+        for index in indices:
+            if minmax:
+                offset = index * 3
+                offsets = range(offset, offset + 3) if subtract else [offset]
+            else:
+                offsets = [index if index >= 0 else -1]
+            for offset in offsets:
+                hasher.update(get_column(data, offset).tobytes())
+        return hasher.digest()
+
+    def load(self, filename: str=None):
+        """Load the entries of the on-disk store, if any
+        """
+        if filename:
+            self.filename = filename
+        if not self.filename:
+            return
+        data = read_text_safe(self.filename, want_bytes=True)
+        if not data:
+            return
+        try:
+            entries = pickle.loads(data)
+            items = entries.items()
+        except (pickle.UnpicklingError, AttributeError, EOFError, TypeError, ValueError) as e:
+            logging.error({'status': 'benford_cache_load__error', 'error': e, 'filename': self.filename})
+            return
+        for key, result in items:
+            self.store(key, result)
+
+    def merge(self, news: Dict[str, Any]):
+        """Merge the results of pop_news from a worker process
+        """
+        if not news:
+            return
+        self.hits += news['hits']
+        self.misses += news['misses']
+        for key, result in news['entries'].items():
+            self.store(key, result)
+
+    def pop_news(self) -> Dict[str, Any]:
+        """New entries + counters since the last call
+        """
+        news = {'entries': self.news, 'hits': self.hits, 'misses': self.misses}
+        self.hits = 0
+        self.misses = 0
+        self.news = {}
+        return news
+
+    def save(self):
+        """Save the entries to the on-disk store
+        """
+        if self.filename:
+            write_text_safe(self.filename, pickle.dumps(dict(self.entries), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters
+        """
+        count = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'rate': self.hits / count if count else 0,
+        }
+
+    def store(self, key: bytes, result: Tuple[Any, ...]):
+        """Add an entry, evict the least recently used
+        """
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class PrefixCounts:
+    """Cumulative digit counts of a series => counts of any [start, end) window with 2 lookups
+    - columns 0-9 are the counts in 1/10th, column 10 is the total
+    - subtract: the first row of a window is compared to 0, like calculate_benford on a slice,
+        so the rows compared to 0 are kept in self.heads
+    """
+    __slots__ = ('benford_id', 'cumuls', 'heads', 'length', 'subtract')
+
+    def __init__(
+            self,
+            benford_id: int,
+            data: List[Any] or np.ndarray,
+            indices: List[int],
+            minmax: bool=False,
+            subtract: bool=False,
+            ):
+        rows = row_counts(benford_id, data, indices, minmax=minmax, subtract=subtract)
+        self.benford_id = benford_id
+        self.length = len(rows)
+        self.subtract = subtract
+
+        self.cumuls = np.zeros((self.length + 1, 11), dtype=np.int64)
+        np.cumsum(rows, axis=0, out=self.cumuls[1:])
+        self.heads = row_counts(benford_id, data, indices, minmax=minmax, subtract=True, prev=False) \
+            if subtract else rows
+
+    def counts(self, start: int, end: int) -> np.ndarray:
+        """Counts in 1/10th + total of the window [start, end)
+        """
+        if end <= start:
+            return np.zeros(11, dtype=np.int64)
+        cumuls = self.cumuls
+        if not self.subtract:
+            return cumuls[end] - cumuls[start]
+        return self.heads[start] + cumuls[end] - cumuls[start + 1]
+
+    def widen(self, start: int, end: int, min_count: int) -> Tuple[int, int]:
+        """Widen [start, end) by 1 on each side until its total reaches min_count, or it covers everything
+        - the total without the first row only grows => binary search,
+            then the first row (0 or 1 per index) is checked in the remaining gap
+        """
+        cumuls = self.cumuls
+        length = self.length
+        last = max(start, length - end)
+        shift = 1 if self.subtract else 0
+
+        def get_bounds(step: int) -> Tuple[int, int]:
+            return max(start - step, 0), min(end + step, length)
+
+        def get_inner(step: int) -> int:
+            left, right = get_bounds(step)
+            return int(cumuls[right, 10] - cumuls[min(left + shift, right), 10])
+
+        def find_step(count: int) -> int:
+            low, high = 0, last + 1
+            while low < high:
+                middle = (low + high) // 2
+                if get_inner(middle) >= count:
+                    high = middle
+                else:
+                    low = middle + 1
+            return low
+
+        if self.subtract:
+            low = find_step(min_count - int(self.heads[:, 10].max(initial=0)))
+            high = min(find_step(min_count), last)
+            for step in range(low, high + 1):
+                left, right = get_bounds(step)
+                if self.counts(left, right)[10] >= min_count:
+                    return left, right
+            return get_bounds(last)
+
+        return get_bounds(min(find_step(min_count), last))
+
+    def window(self, start: int, end: int) -> Tuple[int, float, float, List[int], bool, bool]:
+        """Same result as calculate_benford(data[start: end])
+        """
+        counts = self.counts(start, end)
+        return score_counts(self.benford_id, counts[:10], int(counts[10]))
+
+    def windows(self, starts: np.ndarray, ends: np.ndarray, exact: bool=False) -> Tuple[np.ndarray, ...]:
+        """Score many windows [starts[i], ends[i]) at once
+        :return: totals, chis, scores, counts
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.maximum(np.asarray(ends, dtype=np.int64), starts)
+        cumuls = self.cumuls
+        if self.subtract:
+            heads = np.where((ends > starts)[:, None], self.heads[np.minimum(starts, self.length - 1)], 0)
+            counts = heads + cumuls[ends] - cumuls[np.minimum(starts + 1, ends)]
+        else:
+            counts = cumuls[ends] - cumuls[starts]
+
+        totals = counts[:, 10]
+        counts = (counts[:, :10] + 5) // 10
+        chis, scores = chi_squares(self.benford_id, counts, totals, exact=exact)
+        return totals, chis, scores, counts
+
+
+def calculate_benford(
+        benford_id: int,                    # 1 or 2
+        data: List[Any] or np.ndarray,
+        indices: List[int],                 # data[index]
+        minmax: bool=False,                 # [value1, min1, max1, value2, min2, max2, count]
+        subtract: bool=False,
+        ) -> Tuple[int, float, float, List[int], bool, bool]:
+    """Calculate the probability to have a fraud, same result as the scalar version
+    - counts are accumulated in 1/10th: a value adds 10, a [min, max] range adds 1 for each of its 10 samples
+    """
+    counts = np.zeros(10, dtype=np.int64)
+    total = 0
+
+    # 1) get the 1st and 2nd digits
+    for index in indices:
+        rows, digits, weight = collect_digits(benford_id, data, index, minmax, subtract)
+        total += len(rows)
+        counts += np.bincount(digits.ravel(), minlength=10) * weight
+
+    # 2) calculate chi-square
+    return score_counts(benford_id, counts, total)
+
+
+def calculate_table(
+        digits: np.ndarray,                 # [column, benford_id - 1, row], see get_digit_table
+        groups: List[List[int]],            # columns of each test
+        ) -> List[List[Tuple[int, float, float, List[int], bool, bool]]]:
+    """All the Benford tests of a digit table in 1 pass: 1st + 2nd digit x each group of columns
+    - same results as calculate_benford(benford_id, data, group)
+    :return: [benford_id - 1][group] = total, chi, score, counts, enough, enough2
+    """
+    num_column, _, length = digits.shape
+    digits = digits.reshape(num_column * 2, length)
+    valids = digits >= 0
+    cells = (np.arange(num_column * 2)[:, None] * 10 + digits)[valids]
+    counts = np.bincount(cells, minlength=num_column * 20).reshape(num_column, 2, 10) * 10
+    totals = valids.sum(axis=1).reshape(num_column, 2)
+
+    return [
+        [score_counts(bid + 1, counts[group, bid].sum(axis=0), int(totals[group, bid].sum())) for group in groups]
+        for bid in (0, 1)]
+
+
+def chi_square(benford_id: int, counts: List[int], total: int, exact: bool=False) -> Tuple[float, float]:
+    """Chi-square of the digit counts against Benford + its score (P-value)
+    - the bins are summed in order, to get the exact same float as before
+    """
+    benfords = BENFORDS[benford_id]
+    num_digit = 9 if benford_id == 1 else 10
+
+    chi = 0
+    if total:
+        for i in range(10 - num_digit, 10):
+            expect = benfords[i] * total
+            chi += (counts[i] - expect) ** 2 / expect
+
+    return chi, get_score(chi, num_digit - 1, exact=exact)
+
+
+def chi_squares(
+        benford_id: int,
+        counts: np.ndarray,                 # [n, 10]
+        totals: np.ndarray,                 # [n]
+        exact: bool=False,
+        ) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized chi_square: the bins are still summed in order => same floats
+    """
+    benfords = BENFORDS[benford_id]
+    num_digit = 9 if benford_id == 1 else 10
+    totals = np.asarray(totals)
+
+    chis = np.zeros(len(totals), dtype=np.float64)
+    valid = totals > 0
+    safes = np.where(valid, totals, 1)
+    for i in range(10 - num_digit, 10):
+        expects = benfords[i] * safes
+        chis += np.where(valid, (counts[:, i] - expects) ** 2 / expects, 0)
+
+    return chis, get_scores(chis, num_digit - 1, exact=exact)
+
+
+def collect_digits(
+        benford_id: int,
+        data: List[Any] or np.ndarray,
+        index: int,
+        minmax: bool,
+        subtract: bool,
+        prev: bool=True,                    # False => subtract 0 instead of the previous row
+        ) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Get the digits of data[index]
+    :return: rows kept, digits (1 per value or 10 per range), weight in 1/10th
+    """
+    bid = benford_id - 1
+    offset = index * (3 if minmax else 1)
+    delta = subtract and prev
+
+    if minmax and subtract:
+        columns = [get_column(data, offset + i, delta) for i in range(3)]
+        rows, digits = range_digits(*columns, bid)
+        return rows, digits, 1
+
+    rows, digits = value_digits(get_column(data, offset if index >= 0 else -1, delta), bid)
+    return rows, digits[:, None], 10
+
+
+def count_series(
+        benford_id: int,
+        data: List[Any] or np.ndarray,
+        indices: List[int],
+        minmax: bool=False,
+        checkpoints: Dict[int, np.ndarray]=None,    # previous run: {row: counts of the rows before it}
+        first: int=0,                               # previous run: rows before first are the same
+        ) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    """Counts of all the rows of a series, subtract=True: score_counts of them = calculate_benford
+    - only the rows after the last checkpoint <= first are counted
+    - the new checkpoints are denser near the end: length - 1, length - 2, length - 4, ...,
+        as the rows that change between 2 runs are the last ones
+    :return: counts in 1/10th + total, checkpoints for the next run
+    """
+    length = len(data)
+    start = max((row for row in checkpoints or () if row <= min(first, length)), default=0)
+    if start:
+        cumuls = checkpoints[start] + np.cumsum(
+            row_counts(benford_id, data[start - 1: length], indices, minmax=minmax, subtract=True)[1:], axis=0)
+    else:
+        cumuls = np.cumsum(row_counts(benford_id, data, indices, minmax=minmax, subtract=True), axis=0)
+
+    # checkpoints: the previous ones before start are still valid
+    rows = {row: counts for row, counts in (checkpoints or {}).items() if row <= start}
+    step = 1
+    while (row := length - step) > start:
+        rows[row] = cumuls[row - start - 1].copy()
+        step *= 2
+    news = {}
+    step = 1
+    while length - step >= 0:
+        if lowers := [row for row in rows if row <= length - step]:
+            news.setdefault(row := max(lowers), rows[row])
+        step *= 2
+
+    counts = cumuls[-1] if len(cumuls) else checkpoints[start] if start else np.zeros(11, dtype=np.int64)
+    return counts, news
+
+
+def get_column(data: List[Any] or np.ndarray, index: int, subtract: bool=False) -> np.ndarray:
+    """Extract a column as int64, -1 means the data itself
+    - subtract => delta with the previous row, the first row is compared to 0
+    """
+    if isinstance(data, (Counties, Series)):
+        column = data.column(index)
+    elif isinstance(data, np.ndarray):
+        column = data if index < 0 else data[:, index]
+        column = column.astype(np.int64, copy=False)
+    elif index < 0:
+        column = np.fromiter(data, dtype=np.int64, count=len(data))
+    else:
+        column = np.fromiter((datum[index] for datum in data), dtype=np.int64, count=len(data))
+
+    if subtract:
+        column = np.diff(column, prepend=0)
+    return column
+
+
+def get_digits(values: np.ndarray, lengths: np.ndarray, bid: int) -> np.ndarray:
+    """Get the digit #bid (0 = leading) of each value, lengths = number of digits
+    """
+    return values // POW10[lengths - 1 - bid] % 10
+
+
+def get_digit_table(columns: np.ndarray) -> np.ndarray:
+    """1st + 2nd digits of the values of each column, -1 = not counted, like value_digits
+    :return: [column, digit - 1, row]
+    """
+    valids = columns >= 1
+    lengths = get_lengths(np.where(valids, columns, 1))
+    digits = np.empty((len(columns), 2, columns.shape[1]), dtype=np.int64)
+    for bid in (0, 1):
+        keep = valids & (lengths > bid)
+        digits[:, bid] = np.where(keep, get_digits(columns, np.maximum(lengths, bid + 1), bid), -1)
+    return digits
+
+
+def get_lengths(values: np.ndarray) -> np.ndarray:
+    """Number of decimal digits of each value >= 1
+    """
+    return np.searchsorted(POW10, values, side='right')
+
+
+def range_digits(d0: np.ndarray, dmin: np.ndarray, dmax: np.ndarray, bid: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Digits of [min, max] ranges, each range is sampled 10x
+    - all 3 values must be >= 1 and have the same number of digits
+    """
+    rows = np.flatnonzero((d0 >= 1) & (dmin >= 1) & (dmax >= 1))
+    d0, dmin, dmax = d0[rows], dmin[rows], dmax[rows]
+
+    lengths = get_lengths(d0)
+    keep = (lengths > bid) & (get_lengths(dmin) == lengths) & (get_lengths(dmax) == lengths)
+    rows, d0, dmin, dmax, lengths = rows[keep], d0[keep], dmin[keep], dmax[keep], lengths[keep]
+
+    imin = np.minimum(np.minimum(d0, dmin), dmax)[:, None]
+    imax = np.maximum(np.maximum(d0, dmin), dmax)[:, None]
+    samples = np.floor(imin + (imax - imin) * STEPS / 9).astype(np.int64)
+    return rows, get_digits(samples, lengths[:, None], bid)
+
+
+def row_counts(
+        benford_id: int,
+        data: List[Any] or np.ndarray,
+        indices: List[int],
+        minmax: bool=False,
+        subtract: bool=False,
+        prev: bool=True,
+        ) -> np.ndarray:
+    """Counts of each row: columns 0-9 = counts in 1/10th, column 10 = total
+    """
+    length = len(data)
+    rows = np.zeros((length, 11), dtype=np.int64)
+    for index in indices:
+        kept, digits, weight = collect_digits(benford_id, data, index, minmax, subtract, prev=prev)
+        cells = (kept[:, None] * 11 + digits).ravel()
+        rows += np.bincount(cells, minlength=length * 11).reshape(length, 11) * weight
+        rows[kept, 10] += 1
+    return rows
+
+
+def score_counts(benford_id: int, counts: np.ndarray, total: int) -> Tuple[int, float, float, List[int], bool, bool]:
+    """Round the counts in 1/10th, then calculate the chi-square + score
+    """
+    counts = ((counts + 5) // 10).tolist()
+    chi, score = chi_square(benford_id, counts, total)
+
+    # need enough data, magic number = 30
+    num_digit = 9 if benford_id == 1 else 10
+    enough = total >= ENOUGHS[1] * num_digit
+    enough2 = total >= ENOUGHS[2] * num_digit
+    return total, chi, score, counts, enough, enough2
+
+
+def value_digits(values: np.ndarray, bid: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Digits of values, only values >= 1 with enough digits are counted
+    """
+    rows = np.flatnonzero(values >= 1)
+    values = values[rows]
+    lengths = get_lengths(values)
+    keep = lengths > bid
+    return rows[keep], get_digits(values[keep], lengths[keep], bid)
@@ -1,18 +1,117 @@
 # coding: utf-8
 # @author octopoulo <polluxyz@gmail.com>
-# @version 2020-11-24
+# @version 2026-10-18
 
 """
 Common functions
 """
 
+from collections import deque
+from concurrent.futures import Executor, Future
 import errno
+from hashlib import blake2b
+from itertools import islice
 import json
 import logging
+import mmap
 import os
 from platform import system
 import re
-from typing import Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import zlib
+
+import numpy as np
+
+# optional: brotli => .br sidecar
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# skip everything except [ ] { }, strings included
+RE_JSON_SKIP = re.compile(rb'(?:[^"\[\]{}]+|"(?:[^"\\]+|\\.)*")*', re.S)
+RE_JSON_SCALAR = re.compile(rb'[^\s,\]}]*')
+RE_JSON_SPACE = re.compile(rb'\s*')
+RE_JSON_STRING = re.compile(rb'"(?:[^"\\]+|\\.)*"', re.S)
+
+# columnar file: magic + header size, then the JSON header + the aligned columns
+COLUMNAR_ALIGN = 64
+COLUMNAR_MAGIC = b'AFCOL001'
+# compressed copies of a file: <filename>.<kind>
+SIDECARS = ['br', 'gz']
+
+
+class ColumnarFile:
+    """Read a file from save_columnar_file through a memory map
+    - numeric columns are numpy views on the map => zero-copy, only the pages that are read are loaded
+    - ragged column: `name` (rows concatenated on the last axis) + `name_offsets` (n + 1)
+    """
+    def __init__(self, filename: str):
+        self.filename = filename                        # type: str
+        self.file = open(filename, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.buffer[:8] != COLUMNAR_MAGIC:
+            self.close()
+            raise ValueError(f'not a columnar file: {filename}')
+        size = int.from_bytes(self.buffer[8:16], 'little')
+        self.header = json.loads(self.buffer[16: 16 + size])   # type: Dict[str, Any]
+
+        strings = self.header['strings']
+        self.string_offsets = np.frombuffer(
+            self.buffer, dtype='<i8', count=strings['count'] + 1, offset=strings['offsets'])
+
+    def close(self):
+        """Release the map
+        """
+        if self.buffer:
+            # views still in use => the map is released with them
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass
+            self.buffer = None
+        self.file.close()
+
+    def column(self, table: str, name: str) -> np.ndarray or List[str]:
+        """Get a column of a table: a numpy view, or a list for a string column
+        """
+        info = self.header['tables'][table][name]
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape'], dtype=np.int64))
+        array = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=info['offset']).reshape(info['shape'])
+        if info.get('strings'):
+            return [self.string(index) for index in array.tolist()]
+        return array
+
+    def names(self, table: str) -> List[str]:
+        """Names of the columns of a table
+        """
+        return list(self.header['tables'][table])
+
+    def ragged(self, table: str, name: str, row: int) -> np.ndarray:
+        """Get 1 row of a ragged column, ex: the time series of 1 state
+        """
+        offsets = self.column(table, f'{name}_offsets')
+        return self.column(table, name)[..., offsets[row]: offsets[row + 1]]
+
+    def string(self, index: int) -> str:
+        """Get a string from the string table
+        """
+        start, end = self.string_offsets[index: index + 2] + self.header['strings']['data']
+        return self.buffer[start: end].decode('utf-8')
+
+    def tables(self) -> List[str]:
+        """Names of the tables
+        """
+        return list(self.header['tables'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
 
 
 def clamp(number: int or float, low: int or float, high: int or float) -> int or float:
@@ -25,6 +124,195 @@ def clamp(number: int or float, low: int or float, high: int or float) -> int or
     return number
 
 
+def get_digest(array: np.ndarray) -> str:
+    """Fingerprint of the content of an array
+    """
+    return blake2b(np.ascontiguousarray(array).tobytes(), digest_size=16).hexdigest()
+
+
+def get_fingerprint(data: Any) -> str:
+    """Fingerprint of JSON data
+    """
+    code = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return blake2b(code.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def get_offsets(lengths: List[int]) -> np.ndarray:
+    """Offsets of ragged rows: [0, len0, len0 + len1, ...]
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths, dtype=np.int64)
+    return offsets
+
+
+def get_round_default(default: Callable or None, precision: int) -> Callable or None:
+    """Wrap a json default function so that its output floats are rounded
+    """
+    if not default:
+        return None
+    return lambda value: round_floats(default(value), precision)
+
+
+def iter_bounded(executor: Executor, func: Callable, tasks: Iterable, window: int) -> Iterator[Any]:
+    """Like executor.map, but with at most `window` pending tasks => the tasks are consumed lazily
+    - the first window is submitted right away
+    - a task that is already a Future is used as is, ex: a cached result
+    """
+    tasks = iter(tasks)
+
+    def submit(task: Any) -> Future:
+        return task if isinstance(task, Future) else executor.submit(func, task)
+
+    pendings = deque(submit(task) for task in islice(tasks, max(window, 1)))
+
+    def generate():
+        while pendings:
+            result = pendings.popleft().result()
+            for task in islice(tasks, 1):
+                pendings.append(submit(task))
+            yield result
+
+    return generate()
+
+
+def iter_json_chunks(
+        data: Any,
+        depth: int=2,                       # number of levels that are opened
+        sort: bool=False,
+        ascii_: bool=False,
+        default: Callable=None,
+        precision: int=-1,                  # float precision
+        ) -> Iterator[str]:
+    """Encode data to compact JSON, piece by piece => the whole string is never built
+    - the dicts + lists of the first `depth` levels are opened, their items are encoded 1 at a time
+    - same output as json.dumps(data, separators=(',', ':'))
+    """
+    if precision >= 0:
+        default = get_round_default(default, precision)
+
+    def encode(value: Any, level: int) -> Iterator[str]:
+        if level < depth and isinstance(value, dict):
+            yield '{'
+            keys = sorted(value) if sort else value
+            for i, key in enumerate(keys):
+                yield f'{"," if i else ""}{json.dumps(str(key), ensure_ascii=ascii_)}:'
+                yield from encode(value[key], level + 1)
+            yield '}'
+        elif level < depth and isinstance(value, (list, tuple)):
+            yield '['
+            for i, item in enumerate(value):
+                if i:
+                    yield ','
+                yield from encode(item, level + 1)
+            yield ']'
+        else:
+            if precision >= 0:
+                value = round_floats(value, precision)
+            yield json.dumps(
+                value, ensure_ascii=ascii_, separators=(',', ':'), sort_keys=sort, default=default)
+
+    yield from encode(data, 0)
+
+
+def iter_json_data(data: Any, paths: List[Tuple[str, ...]]) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+    """Same as iter_json_file, but for data that is already decoded
+    """
+    prefixes = set(path[:i] for path in paths for i in range(len(path)))
+    paths = set(paths)
+
+    def walk(value: Any, path: Tuple[str, ...]) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        if isinstance(value, list) and path in paths:
+            for item in value:
+                yield path, item
+        elif isinstance(value, dict) and path in prefixes:
+            for key, child in value.items():
+                if (child_path := path + (key, )) in paths or child_path in prefixes:
+                    yield from walk(child, child_path)
+        elif path in paths:
+            yield path, value
+
+    yield from walk(data, ())
+
+
+def iter_json_file(filename: str, paths: List[Tuple[str, ...]]) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+    """Stream a JSON file through a memory map, yield (path, value) for each value found at one of the paths
+    - array at a path => yield each of its items, only 1 item is decoded at a time
+    - object at a path that leads to another path => walk inside, otherwise yield it whole
+    - everything else is skipped without being decoded
+    - missing or empty file => nothing, malformed or truncated file => ValueError, after the values before the error
+    """
+    prefixes = set(path[:i] for path in paths for i in range(len(path)))
+    paths = set(paths)
+
+    def find_end(buffer: mmap.mmap, pos: int) -> int:
+        char = buffer[pos]
+        if char == 0x22:
+            return RE_JSON_STRING.match(buffer, pos).end()
+        if char not in (0x5b, 0x7b):
+            return RE_JSON_SCALAR.match(buffer, pos).end()
+        depth = 0
+        while True:
+            pos = RE_JSON_SKIP.match(buffer, pos).end()
+            char = buffer[pos]
+            if char == 0x22:
+                raise ValueError(f'unterminated string at {pos}')
+            depth += 1 if char in (0x5b, 0x7b) else -1
+            pos += 1
+            if not depth:
+                return pos
+
+    def skip_space(buffer: mmap.mmap, pos: int) -> int:
+        return RE_JSON_SPACE.match(buffer, pos).end()
+
+    def walk(buffer: mmap.mmap, pos: int, path: Tuple[str, ...]) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        """Yield the values inside buffer[pos:], return the end position
+        """
+        char = buffer[pos]
+        # a) array => stream its items
+        if char == 0x5b and path in paths:
+            pos = skip_space(buffer, pos + 1)
+            while buffer[pos] != 0x5d:
+                end = find_end(buffer, pos)
+                yield path, json.loads(buffer[pos: end])
+                pos = skip_space(buffer, end)
+                if buffer[pos] == 0x2c:
+                    pos = skip_space(buffer, pos + 1)
+            return pos + 1
+
+        # b) object => walk inside
+        if char == 0x7b and path in prefixes:
+            pos = skip_space(buffer, pos + 1)
+            while buffer[pos] != 0x7d:
+                end = RE_JSON_STRING.match(buffer, pos).end()
+                key = json.loads(buffer[pos: end])
+                pos = skip_space(buffer, end)
+                pos = skip_space(buffer, pos + 1)
+                if (child := path + (key, )) in paths or child in prefixes:
+                    end = yield from walk(buffer, pos, child)
+                else:
+                    end = find_end(buffer, pos)
+                pos = skip_space(buffer, end)
+                if buffer[pos] == 0x2c:
+                    pos = skip_space(buffer, pos + 1)
+            return pos + 1
+
+        # c) other value
+        end = find_end(buffer, pos)
+        if path in paths:
+            yield path, json.loads(buffer[pos: end])
+        return end
+
+    if not filename or not os.path.isfile(filename) or not os.path.getsize(filename):
+        return
+    try:
+        with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start = 3 if buffer[:3] == b'\xef\xbb\xbf' else 0
+            yield from walk(buffer, skip_space(buffer, start), ())
+    except (AttributeError, IndexError, OSError, ValueError) as e:
+        logging.error({'status': 'iter_json_file__error', 'error': e, 'filename': filename})
+        raise ValueError(f'malformed JSON file: {filename}') from e
+
+
 def makedirs_safe(folder: str) -> bool:
     """Create a folder recursively + handle errors
     :return: True if the folder has been created or existed already, False otherwise
@@ -70,6 +358,89 @@ def read_text_safe(filename: str, locked: bool=False, want_bytes: bool=False) ->
     return None
 
 
+def remove_sidecars(filename: str, keeps: List[str]=None):
+    """Remove the compressed copies of a file that weren't just written, they'd no longer match the file
+    """
+    for kind in SIDECARS:
+        if kind in (keeps or []):
+            continue
+        try:
+            os.remove(f'{filename}.{kind}')
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error({'status': 'remove_sidecars__error', 'error': e, 'filename': filename, 'kind': kind})
+
+
+def round_floats(data: Any, precision: int) -> Any:
+    """Round the floats of JSON data, recursively
+    """
+    if isinstance(data, float):
+        return round(data, precision)
+    if isinstance(data, dict):
+        return {key: round_floats(value, precision) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [round_floats(value, precision) for value in data]
+    return data
+
+
+def save_columnar_file(
+        filename: str,
+        tables: Dict[str, Dict[str, np.ndarray or List[str]]],
+        meta: Dict[str, Any]=None,
+        ) -> bool:
+    """Save tables of fixed-width columns, to be read by ColumnarFile
+    - numeric column: any numpy array, saved little-endian
+    - list of strings: saved as int32 indices into the shared string table
+    """
+    strings = {}                                        # type: Dict[str, int]
+    columns = []                                        # type: List[Tuple[Dict[str, Any], str, np.ndarray]]
+    header = {'meta': meta or {}, 'tables': {}}
+
+    for table, items in tables.items():
+        infos = header['tables'][table] = {}
+        for name, column in items.items():
+            info = infos[name] = {}
+            if isinstance(column, list):
+                column = np.array([strings.setdefault(text, len(strings)) for text in column], dtype='<i4')
+                info['strings'] = True
+            else:
+                column = np.ascontiguousarray(column)
+                column = column.astype(column.dtype.newbyteorder('<'), copy=False)
+            info.update(dtype=column.dtype.str, shape=list(column.shape))
+            columns.append((info, 'offset', column))
+
+    # string table: offsets + utf-8 data
+    datas = [text.encode('utf-8') for text in strings]
+    offsets = get_offsets([len(data) for data in datas])
+    header['strings'] = {'count': len(datas)}
+    columns.append((header['strings'], 'offsets', offsets))
+    columns.append((header['strings'], 'data', np.frombuffer(b''.join(datas), dtype=np.uint8)))
+
+    # the header contains the offsets of the columns, which depend on its size => reserve space until it fits
+    def align(pos: int) -> int:
+        return (pos + COLUMNAR_ALIGN - 1) // COLUMNAR_ALIGN * COLUMNAR_ALIGN
+
+    reserve = 0
+    while True:
+        pos = align(16 + reserve)
+        for info, key, column in columns:
+            info[key] = pos
+            pos = align(pos + column.nbytes)
+        code = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        if len(code) <= reserve:
+            break
+        reserve = len(code) + 256
+
+    chunks = [COLUMNAR_MAGIC, reserve.to_bytes(8, 'little'), code.ljust(reserve)]
+    pos = 16 + reserve
+    for info, key, column in columns:
+        chunks.append(bytes(info[key] - pos))
+        chunks.append(column.tobytes())
+        pos = info[key] + column.nbytes
+    return write_chunks(filename, chunks)
+
+
 def save_json_file(
         filename: str,
         data: Any,
@@ -80,22 +451,112 @@ def save_json_file(
         sort: bool=False,                   # True
         convert_newlines: bool=False,
         one_line: bool=False,               # 1 line per data
+        default: Callable=None,             # convert non JSON objects, ex: Series.tolist
+        compact: bool=False,                # no spaces, no newlines
+        compress: List[str]=None,           # sidecars: ['gz', 'br']
         ) -> bool:                          # True on success, False on error
     """Encode data to json and save it
     """
     try:
-        code = json.dumps(data, ensure_ascii=ascii_, indent=indent, sort_keys=sort)
+        if precision >= 0:
+            data, default = round_floats(data, precision), get_round_default(default, precision)
+        if compact:
+            code = json.dumps(data, ensure_ascii=ascii_, separators=(',', ':'), sort_keys=sort, default=default)
+        else:
+            code = json.dumps(data, ensure_ascii=ascii_, indent=indent, sort_keys=sort, default=default)
         if one_line and (code := code.replace('","', '",\n"')):
             if code[0] == '{':
                 code = code[0] + '\n' + code[1:]
             if code[-1] == '}':
                 code = code[:-1] + '\n}'
+        if compress:
+            return write_chunks(filename, [code], compress=compress)
+        remove_sidecars(filename)
         return write_text_safe(filename, code, locked=locked, convert_newlines=convert_newlines)
     except Exception as e:
         logging.error({'status': 'save_json_file__invalid_data', 'error': e})
         return False
 
 
+def save_json_stream(
+        filename: str,
+        data: Any,
+        depth: int=2,                       # see iter_json_chunks
+        ascii_: bool=False,
+        precision: int=-1,                  # float precision
+        sort: bool=False,
+        default: Callable=None,             # convert non JSON objects, ex: Series.tolist
+        compress: List[str]=None,           # sidecars: ['gz', 'br']
+        ) -> bool:                          # True on success, False on error
+    """Encode data to compact json while writing it, 1 item at a time
+    """
+    chunks = iter_json_chunks(data, depth=depth, sort=sort, ascii_=ascii_, default=default, precision=precision)
+    try:
+        return write_chunks(filename, chunks, compress=compress)
+    except Exception as e:
+        logging.error({'status': 'save_json_stream__invalid_data', 'error': e})
+        return False
+
+
+def write_chunks(filename: str, chunks: Iterable[str or bytes], compress: List[str]=None) -> bool:
+    """Write chunks to a file + compressed sidecars: .gz, .br (if brotli is installed)
+    - the chunks are compressed as they come
+    - the other sidecars are removed
+    """
+    if not filename or not makedirs_safe(os.path.dirname(filename)):
+        return False
+
+    files = []
+    kinds = []
+    try:
+        files.append((open(filename, 'wb'), None, None))
+        for kind in compress or []:
+            if kind == 'gz':
+                compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+                files.append((open(f'{filename}.gz', 'wb'), compressor.compress, compressor.flush))
+                kinds.append(kind)
+            elif kind == 'br':
+                if not brotli:
+                    logging.error({'status': 'write_chunks__error', 'error': 'brotli is not installed'})
+                    continue
+                compressor = brotli.Compressor()
+                files.append((open(f'{filename}.br', 'wb'), compressor.process, compressor.finish))
+                kinds.append(kind)
+
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            size += len(buffer[-1])
+            if size < 1 << 16:
+                continue
+            write_buffers(files, b''.join(buffer))
+            buffer.clear()
+            size = 0
+
+        write_buffers(files, b''.join(buffer))
+        for file, _, finish in files:
+            if finish:
+                file.write(finish())
+        remove_sidecars(filename, kinds)
+        return True
+    except OSError as e:
+        logging.error({'status': 'write_chunks__error', 'error': e, 'filename': filename})
+        return False
+    finally:
+        for file, _, _ in files:
+            file.close()
+
+
+def write_buffers(files: List[Tuple[Any, Callable, Callable]], data: bytes):
+    """Write data to files, compressed or not
+    """
+    if not data:
+        return
+    for file, process, _ in files:
+        file.write(process(data) if process else data)
+
+
 def write_text_safe(
         filename: str,
         data: str or bytes,
@@ -0,0 +1,45 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Columnar county table
+"""
+
+from typing import Any, List
+
+import numpy as np
+
+
+# row = [d, r, l, votes, fips, name]
+COUNTY_FIELDS = ['d', 'r', 'l', 'votes', 'fips', 'name']
+
+
+class Counties:
+    """Counties of a state, the votes stored as 1 int64 column per field: columns[field][county]
+    - counties[i] => row as a list, like the old [d, r, l, votes, fips, name]
+    - digits: [candidate, digit - 1, county] = 1st + 2nd digits of the votes of d, r, l, -1 = not counted,
+        extracted once by benford.get_digit_table, for all the Benford tests of the state
+    """
+    __slots__ = ('columns', 'digits', 'fips', 'names')
+
+    def __init__(self, columns: np.ndarray or List[List[int]], fips: List[str], names: List[str]):
+        self.columns = np.asarray(columns, dtype=np.int64).reshape(4, -1)
+        self.digits = None                              # type: np.ndarray
+        self.fips = fips                                # type: List[str]
+        self.names = names                              # type: List[str]
+
+    def __getitem__(self, index: int) -> List[Any]:
+        return [*self.columns[:, index].tolist(), self.fips[index], self.names[index]]
+
+    def __len__(self) -> int:
+        return self.columns.shape[1]
+
+    def column(self, index: int) -> np.ndarray:
+        """Column of a field, by index in the row
+        """
+        return self.columns[index]
+
+    @property
+    def votes(self) -> np.ndarray:
+        return self.columns[3]
@@ -0,0 +1,198 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Fetcher: HTTP downloads over a keep-alive session, with a thread pool, rate limit + retries
++ on-disk cache with conditional GET
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+from hashlib import blake2b
+import logging
+import os
+from threading import Lock
+from time import sleep, time
+from typing import Any, Dict, Iterable, Iterator, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from commoner import iter_bounded, open_json_file, read_text_safe, save_json_file, write_text_safe
+
+# optional: brotli => urllib3 can decode 'br'
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+
+# retry those status codes, the others are final
+RETRY_CODES = {429, 500, 502, 503, 504}
+
+
+class Fetcher:
+    """Download text from URLs
+    - concurrency: number of simultaneous requests in fetch_many
+    - rate: max requests per second per host, 0 = no limit
+    - timeout: in seconds, for connect + read
+    - retries: extra attempts after a failure, waiting backoff * 2 ** attempt seconds
+    - folder: on-disk cache of the responses, None = no cache
+    - ttl: a cached response younger than ttl seconds is used without any request
+    """
+    def __init__(
+            self,
+            concurrency: int=8,
+            rate: float=0,
+            timeout: float=30,
+            retries: int=3,
+            backoff: float=0.5,
+            folder: str=None,
+            ttl: float=0,
+            ):
+        self.backoff = backoff                          # type: float
+        self.concurrency = max(concurrency, 1)          # type: int
+        self.folder = folder                            # type: str
+        self.lock = Lock()
+        self.nexts = {}                                 # type: Dict[str, float]
+        self.rate = rate                                # type: float
+        self.retries = retries                          # type: int
+        self.timeout = timeout                          # type: float
+        self.ttl = ttl                                  # type: float
+
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url: str) -> str or None:
+        """Get text data from an URL, with retries
+        """
+        return self.fetch_changed(url)[0]
+
+    def fetch_changed(self, url: str) -> Tuple[str or None, bool]:
+        """Get text data from an URL, with retries + cache
+        :return: text, changed (False = same text as the cached response)
+        """
+        if not url:
+            return None, False
+
+        # 1) fresh enough => no request
+        key, entry = self.get_entry(url)
+        if entry and time() < entry['stamp'] + self.ttl and (text := self.read_body(key)) is not None:
+            return text, False
+
+        headers = {}
+        if entry:
+            if etag := entry.get('etag'):
+                headers['If-None-Match'] = etag
+            if modified := entry.get('modified'):
+                headers['If-Modified-Since'] = modified
+
+        # 2) conditional GET
+        for attempt in range(self.retries + 1):
+            if attempt:
+                sleep(self.backoff * 2 ** (attempt - 1))
+            self.wait_host(url)
+
+            try:
+                res = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                logging.error({'status': 'download__error', 'error': e, 'url': url, 'attempt': attempt})
+                continue
+
+            if res.status_code == 304 and entry:
+                text = self.read_body(key)
+                if text is not None:
+                    entry['stamp'] = time()
+                    save_json_file(os.path.join(self.folder, f'{key}.json'), entry)
+                    return text, False
+                headers = {}
+                continue
+
+            if res.status_code == 200:
+                text = res.text
+                return text, self.save_entry(key, url, res, text)
+            logging.error({'status': 'download__error', 'status_code': res.status_code, 'url': url})
+            if res.status_code not in RETRY_CODES:
+                break
+
+        return None, False
+
+    def fetch_many(self, urls: Iterable[str]) -> Iterator[Tuple[str, str or None, bool]]:
+        """Fetch URLs concurrently, yield (url, text, changed) in the order of the URLs, as soon as they arrive
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            yield from iter_bounded(executor, self.fetch_triple, urls, self.concurrency * 2)
+
+    def fetch_triple(self, url: str) -> Tuple[str, str or None, bool]:
+        """Fetch an URL, return it with its text + changed
+        """
+        return (url, *self.fetch_changed(url))
+
+    def get_entry(self, url: str) -> Tuple[str, Dict[str, Any] or None]:
+        """Get the cached validators of an URL
+        :return: key, entry
+        """
+        key = blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+        if not self.folder:
+            return key, None
+        entry = open_json_file(os.path.join(self.folder, f'{key}.json'))
+        if entry.get('url') != url:
+            return key, None
+        return key, entry
+
+    def read_body(self, key: str) -> str or None:
+        """Read a cached body
+        """
+        data = read_text_safe(os.path.join(self.folder, f'{key}.gz'), want_bytes=True)
+        if data is None:
+            return None
+        try:
+            return gzip.decompress(data).decode('utf-8')
+        except (OSError, ValueError) as e:
+            logging.error({'status': 'read_body__error', 'error': e, 'key': key})
+            return None
+
+    def save_entry(self, key: str, url: str, res: requests.Response, text: str) -> bool:
+        """Save a response in the cache, the body is gzipped
+        :return: True if the text changed
+        """
+        if not self.folder:
+            return True
+
+        data = text.encode('utf-8')
+        digest = blake2b(data, digest_size=16).hexdigest()
+        filename = os.path.join(self.folder, f'{key}.json')
+        changed = open_json_file(filename).get('digest') != digest
+
+        if changed:
+            write_text_safe(os.path.join(self.folder, f'{key}.gz'), gzip.compress(data, compresslevel=6))
+        save_json_file(filename, {
+            'digest': digest,
+            'etag': res.headers.get('ETag'),
+            'modified': res.headers.get('Last-Modified'),
+            'stamp': time(),
+            'url': url,
+        })
+        return changed
+
+    def wait_host(self, url: str):
+        """Rate limit: wait until the host can be requested again
+        """
+        if self.rate <= 0:
+            return
+
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time()
+            start = max(now, self.nexts.get(host, 0))
+            self.nexts[host] = start + 1 / self.rate
+
+        if start > now:
+            sleep(start - now)
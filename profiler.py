@@ -0,0 +1,238 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Profiler: per-stage + per-state timers, counters, peak memory
+"""
+
+from contextlib import contextmanager, nullcontext
+import cProfile
+import io
+import pstats
+import sys
+from time import perf_counter, process_time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from commoner import save_json_file
+
+# optional: not on windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+NULL_CONTEXT = nullcontext()
+
+
+class Profiler:
+    """Timers + counters, disabled by default => start/stage/iterate return right away
+    - mode: '' = disabled, 'basic', 'cprofile' or 'tracemalloc'
+    - worker process: pop gives its measures, merge adds them in the main process
+    - stage 'a/b' is nested inside stage 'a' => not added twice to the totals of a state
+    """
+    def __init__(self):
+        self.counters = {}                              # type: Dict[str, int]
+        self.mode = ''                                  # type: str
+        self.profile = ''                               # type: str
+        self.stages = {}                                # type: Dict[str, list]
+        self.states = {}                                # type: Dict[str, Dict[str, float]]
+        self.totals = {}                                # type: Dict[str, Any]
+
+    def add(self, name: str, wall: float, cpu: float, key: str=None):
+        """Add a measure to a stage, + to a state if key
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = [0, 0.0, 0.0]
+        stage[0] += 1
+        stage[1] += wall
+        stage[2] += cpu
+        if key is not None:
+            state = self.states.setdefault(key, {})
+            state[name] = state.get(name, 0) + wall
+
+    def count(self, name: str, number: int=1):
+        """Increase a counter
+        """
+        if self.mode:
+            self.counters[name] = self.counters.get(name, 0) + number
+
+    def enable(self, mode: str or bool):
+        """Enable the profiler, True = basic
+        """
+        self.mode = 'basic' if mode is True else mode or ''
+
+    def iterate(self, name: str, items: Iterable[Any]) -> Iterable[Any]:
+        """Time the production of each item, ex: streaming from a file
+        """
+        if not self.mode:
+            return items
+
+        def generate() -> Iterator[Any]:
+            iterator = iter(items)
+            while True:
+                mark = self.start()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.stop(name, mark)
+                yield item
+
+        return generate()
+
+    def merge(self, data: Dict[str, Any]):
+        """Merge the measures of a worker process
+        """
+        if not data:
+            return
+        for name, (calls, wall, cpu) in data['stages'].items():
+            stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += calls
+            stage[1] += wall
+            stage[2] += cpu
+        for key, values in data['states'].items():
+            state = self.states.setdefault(key, {})
+            for name, wall in values.items():
+                state[name] = state.get(name, 0) + wall
+        for name, number in data['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + number
+
+    def pop(self) -> Dict[str, Any] or None:
+        """Measures since the last call, None if disabled
+        """
+        if not self.mode:
+            return None
+        data = {'counters': self.counters, 'stages': self.stages, 'states': self.states}
+        self.counters = {}
+        self.stages = {}
+        self.states = {}
+        return data
+
+    def report(self) -> Dict[str, Any]:
+        """Structured report, for JSON
+        """
+        return {
+            'counters': self.counters,
+            'memory': get_memory(),
+            'mode': self.mode,
+            'profile': self.profile,
+            'stages': {
+                name: {'calls': calls, 'cpu': cpu, 'wall': wall} for name, (calls, wall, cpu) in self.stages.items()},
+            'states': self.states,
+            'totals': self.totals,
+        }
+
+    def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a function with the totals, + cProfile or tracemalloc depending on the mode
+        """
+        if not self.mode:
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile() if self.mode == 'cprofile' else None
+        if self.mode == 'tracemalloc':
+            tracemalloc.start()
+
+        mark = self.start()
+        try:
+            if profile:
+                return profile.runcall(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        finally:
+            self.totals['wall'] = perf_counter() - mark[0]
+            self.totals['cpu'] = process_time() - mark[1]
+            if profile:
+                stream = io.StringIO()
+                pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(30)
+                self.profile = stream.getvalue()
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                self.totals['tracemalloc_peak_mb'] = peak / 1048576
+                tracemalloc.stop()
+
+    def save(self, filename: str) -> bool:
+        """Save the report as JSON
+        """
+        return save_json_file(filename, self.report(), indent=2, sort=True)
+
+    def stage(self, name: str, key: str=None):
+        """Context manager that times a stage
+        """
+        if not self.mode:
+            return NULL_CONTEXT
+        return self.stage_context(name, key)
+
+    @contextmanager
+    def stage_context(self, name: str, key: str=None):
+        """Enabled version of stage
+        """
+        mark = self.start()
+        try:
+            yield
+        finally:
+            self.stop(name, mark, key)
+
+    def start(self) -> Tuple[float, float] or None:
+        """Start a measure, to be given to stop
+        """
+        if not self.mode:
+            return None
+        return perf_counter(), process_time()
+
+    def stop(self, name: str, mark: Tuple[float, float] or None, key: str=None):
+        """Stop a measure started with start
+        """
+        if mark:
+            self.add(name, perf_counter() - mark[0], process_time() - mark[1], key)
+
+    def table(self, num_state: int=10) -> str:
+        """Human-readable report
+        """
+        lines = [f'{"stage":32} {"calls":>8} {"wall s":>10} {"cpu s":>10}']
+        for name, (calls, wall, cpu) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append(f'{name:32} {calls:8} {wall:10.3f} {cpu:10.3f}')
+
+        if self.totals:
+            lines.append(f'{"total":32} {"":8} {self.totals["wall"]:10.3f} {self.totals["cpu"]:10.3f}')
+
+        if self.states:
+            lines.append('\nslowest states:')
+            totals = {
+                key: sum(wall for name, wall in values.items() if '/' not in name)
+                for key, values in self.states.items()}
+            for key in sorted(totals, key=lambda key: -totals[key])[:num_state]:
+                details = ' '.join(f'{name}={wall:.3f}' for name, wall in sorted(self.states[key].items()))
+                lines.append(f'{key:8} {totals[key]:8.3f} s  {details}')
+
+        if self.counters:
+            lines.append('')
+            lines.extend(f'{name:32} {number:8}' for name, number in sorted(self.counters.items()))
+
+        memory = {**get_memory(), **{key: value for key, value in self.totals.items() if key.endswith('_mb')}}
+        if memory:
+            lines.append('')
+            lines.extend(f'{name:32} {value:8.1f}' for name, value in sorted(memory.items()))
+
+        if self.profile:
+            lines.append('\n' + self.profile)
+        return '\n'.join(lines)
+
+
+def get_memory() -> Dict[str, float]:
+    """Peak resident memory of the process + of its largest child, in MB
+    """
+    if not resource:
+        return {}
+    # linux => KB, macos => bytes
+    scale = (1 if sys.platform == 'darwin' else 1024) / 1048576
+    return {
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'peak_rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+PROFILER = Profiler()
@@ -0,0 +1,274 @@
+# coding: utf-8
+# @author octopoulo <polluxyz@gmail.com>
+# @version 2026-10-18
+
+"""
+Columnar time series
+"""
+
+from datetime import datetime
+from typing import Any, List
+
+import numpy as np
+
+from commoner import clamp
+
+
+# backtracking: rows narrowed at once, smaller series go through the loop
+NARROW_BLOCK = 1024
+NARROW_MIN = 32
+
+# row = [d, dmin, dmax, r, rmin, rmax, votes, stamp]
+SERIES_FIELDS = ['d', 'dmin', 'dmax', 'r', 'rmin', 'rmax', 'votes', 'stamp']
+
+
+class Series:
+    """Time series stored as 1 int64 column per field, columns[field][row]
+    - series[i] => row as a list, like the old [[d, dmin, dmax, r, rmin, rmax, votes, stamp], ...]
+    - series[start: end] => Series sharing the same memory
+    - take => index map on the same memory, the rows are only gathered when the columns are needed
+    - only becomes nested lists with tolist(), when saving to JSON
+    """
+    __slots__ = ('data', 'rows')
+
+    def __init__(self, columns: np.ndarray or List[List[int]], rows: np.ndarray=None):
+        self.data = np.asarray(columns, dtype=np.int64).reshape(len(SERIES_FIELDS), -1)
+        self.rows = rows
+
+    def __getitem__(self, index: int or slice) -> List[int] or 'Series':
+        if isinstance(index, slice):
+            if self.rows is not None:
+                return Series(self.data, self.rows[index])
+            return Series(self.data[:, index])
+        if self.rows is not None:
+            index = self.rows[index]
+        return self.data[:, index].tolist()
+
+    def __iter__(self):
+        return iter(self.columns.T.tolist())
+
+    def __len__(self) -> int:
+        return self.data.shape[1] if self.rows is None else len(self.rows)
+
+    def column(self, index: int) -> np.ndarray:
+        """Column of a field, by index in the row
+        """
+        if self.rows is None:
+            return self.data[index]
+        return self.data[index, self.rows]
+
+    def take(self, indices: np.ndarray or List[int]) -> 'Series':
+        """Series made of the rows at indices, without copy
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        return Series(self.data, indices if self.rows is None else self.rows[indices])
+
+    def tolist(self) -> List[List[Any]]:
+        """Nested lists, for JSON
+        """
+        return self.columns.T.tolist()
+
+    @property
+    def columns(self) -> np.ndarray:
+        if self.rows is None:
+            return self.data
+        return self.data[:, self.rows]
+
+    @columns.setter
+    def columns(self, columns: np.ndarray):
+        self.data = columns
+        self.rows = None
+
+    @property
+    def d(self) -> np.ndarray:
+        return self.column(0)
+
+    @property
+    def r(self) -> np.ndarray:
+        return self.column(3)
+
+    @property
+    def stamps(self) -> np.ndarray:
+        return self.column(7)
+
+    @property
+    def votes(self) -> np.ndarray:
+        return self.column(6)
+
+
+def align_stamps(stamps: np.ndarray, stamps2: np.ndarray) -> np.ndarray:
+    """Align a series on the timestamps of another one: index map, for each stamp => the nearest row of stamps2
+    - same results as align_stamps_loop, in 1 search when both are sorted:
+        row j goes with stamp i while |t - stamps[i]| <= |t - stamps[i + 1]| <=> 2 * t <= stamps[i] + stamps[i + 1]
+    """
+    num = len(stamps)
+    num2 = len(stamps2)
+    if not num or not num2 or np.any(stamps[1:] <= stamps[:-1]) or np.any(stamps2[1:] < stamps2[:-1]):
+        return np.array(align_stamps_loop(stamps.tolist(), stamps2.tolist()), dtype=np.intp)
+
+    indices = np.empty(num, dtype=np.intp)
+    indices[:-1] = np.searchsorted(stamps2 * 2, stamps[:-1] + stamps[1:], side='right')
+
+    # last stamp: compared with 0
+    j = indices[-2] if num > 1 else 0
+    last = stamps[-1]
+    stops = np.flatnonzero(np.abs(stamps2[j:] - last) > np.abs(stamps2[j:]))
+    indices[-1] = j + stops[0] if stops.size else num2
+    return np.minimum(indices, num2 - 1)
+
+
+def align_stamps_loop(stamps: List[int], stamps2: List[int]) -> List[int]:
+    """Alignment of align_stamps, with 2 pointers
+    """
+    num = len(stamps)
+    num2 = len(stamps2)
+    indices = []
+    i = 0
+    j = 0
+    while i < num:
+        cur = stamps[i]
+        if i + 1 < num:
+            nxt = stamps[i + 1]
+        else:
+            nxt = 0
+
+        while j < num2:
+            t2 = stamps2[j]
+            if abs(t2 - cur) > abs(t2 - nxt):
+                break
+            j += 1
+
+        indices.append(j if j < num2 else num2 - 1)
+        i += 1
+    return indices
+
+
+def narrow_step(lows: Any, highs: Any, counts: Any, i: int, j: int):
+    """Narrow the window of row i with the one of row j = i + 1, in place
+    """
+    delta = counts[j] - counts[i]
+    # normal
+    if delta >= 0:
+        lows[i] = clamp(lows[i], lows[j] - delta, highs[j])
+        highs[i] = clamp(highs[i], lows[j] - delta, highs[j])
+    # removing votes
+    else:
+        lows[i] = clamp(lows[i], lows[j], highs[j] - delta)
+        highs[i] = clamp(highs[i], highs[j], highs[j] - delta)
+
+
+def narrow_windows(
+        values: np.ndarray,
+        lows: np.ndarray,
+        highs: np.ndarray,
+        counts: np.ndarray,
+        olds: np.ndarray=None,              # incremental: [value, low, high] columns of the previous run
+        start: int=0,                       # incremental: rows before start are the same as in the previous run
+        ) -> int:
+    """Backtracking: narrow the [low, high] windows from the last row to the first, in place, value = middle
+    - same results as narrow_windows_loop, but by blocks of rows:
+        while the votes grow and the windows overlap, the clamps are a max + a min =>
+        low - votes = reverse cumulative max, high = reverse cumulative min
+    - the rows where that doesn't hold go through narrow_step, with more rows each time it happens again,
+        as the windows usually stay apart for a while
+    :return: first row that changed since the previous run, 0 = all rows
+    """
+    length = len(lows)
+    if length < NARROW_MIN:
+        columns = [values.tolist(), lows.tolist(), highs.tolist()]
+        first = narrow_windows_loop(*columns, counts.tolist(), olds=olds, start=start)
+        values[:], lows[:], highs[:] = columns
+        return first
+
+    stop = length - 1
+    narrow_step(lows, highs, counts, stop, stop)
+    values[stop] = (lows[stop] + highs[stop] + 1) // 2
+    num_loop = 1
+    while stop > 0:
+        # 1) assume that the rows are normal
+        begin = max(stop - NARROW_BLOCK, 0)
+        low = lows[begin: stop]
+        high = highs[begin: stop]
+        count = counts[begin: stop]
+        news = np.maximum.accumulate(np.append(low - count, lows[stop] - counts[stop])[::-1])[::-1][:-1] + count
+        news2 = np.minimum.accumulate(np.append(high, highs[stop])[::-1])[::-1][:-1]
+
+        # 2) check with the window of the next row, keep the rows after the last wrong one
+        nexts = np.append(news[1:], lows[stop])
+        nexts2 = np.append(news2[1:], highs[stop])
+        deltas = counts[begin + 1: stop + 1] - count
+        bads = np.flatnonzero(
+            (deltas < 0) | (low > nexts2) | (high < nexts - deltas) | (nexts - deltas > nexts2))
+        bad = bads[-1] if bads.size else -1
+        lows[begin + bad + 1: stop] = news[bad + 1:]
+        highs[begin + bad + 1: stop] = news2[bad + 1:]
+        end = stop
+        stop = begin + bad + 1
+
+        # 3) wrong row => loop
+        if bad >= 0:
+            num_loop = max(num_loop // 2, 1) if end - stop >= num_loop * 2 else min(num_loop * 2, NARROW_BLOCK)
+            last = stop
+            stop = max(last - num_loop, 0)
+            low = lows[stop: last + 1].tolist()
+            high = highs[stop: last + 1].tolist()
+            count = counts[stop: last + 1].tolist()
+            for i in range(last - stop - 1, -1, -1):
+                narrow_step(low, high, count, i, i + 1)
+            lows[stop: last] = low[:-1]
+            highs[stop: last] = high[:-1]
+
+        values[stop: end] = (lows[stop: end] + highs[stop: end] + 1) // 2
+
+        # same row as before => the rows before are also the same
+        if olds is not None and stop < start:
+            last = min(end, start)
+            sames = np.flatnonzero(
+                (values[stop: last] == olds[0, stop: last]) & (lows[stop: last] == olds[1, stop: last])
+                & (highs[stop: last] == olds[2, stop: last]))
+            if sames.size:
+                same = stop + sames[-1]
+                values[:same] = olds[0, :same]
+                lows[:same] = olds[1, :same]
+                highs[:same] = olds[2, :same]
+                return min(start, same + 1)
+    return 0
+
+
+def narrow_windows_loop(
+        values: List[int],
+        lows: List[int],
+        highs: List[int],
+        counts: List[int],
+        olds: np.ndarray=None,
+        start: int=0,
+        ) -> int:
+    """Backtracking of narrow_windows, 1 row at a time, in place
+    :return: first row that changed since the previous run, 0 = all rows
+    """
+    j = len(lows) - 1
+    for i in range(len(lows) - 1, -1, -1):
+        narrow_step(lows, highs, counts, i, j)
+        values[i] = (lows[i] + highs[i] + 1) // 2
+        j = i
+
+        # same row as before => the rows before are also the same
+        if i < start and values[i] == olds[0, i] and lows[i] == olds[1, i] and highs[i] == olds[2, i]:
+            values[:i] = olds[0, :i].tolist()
+            lows[:i] = olds[1, :i].tolist()
+            highs[:i] = olds[2, :i].tolist()
+            return min(start, i + 1)
+    return 0
+
+
+def parse_stamps(texts: List[str]) -> np.ndarray:
+    """Convert ISO timestamps to seconds, ex: '2020-11-04T00:01:56Z'
+    - all like 'YYYY-MM-DDTHH:MM:SSZ' => parsed at once by numpy
+    """
+    if all(len(text) == 20 and text[-1] == 'Z' for text in texts):
+        try:
+            return np.array([text[:-1] for text in texts], dtype='datetime64[s]').astype(np.int64)
+        except ValueError:
+            pass
+    return np.array(
+        [int(datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()) for text in texts], dtype=np.int64)